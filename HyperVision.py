@@ -1,10 +1,29 @@
+import argparse
+import glob
+import json
+import multiprocessing
 import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+from urllib.parse import parse_qs, urlparse
+
 import cv2
 import numpy as np
-from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QIcon
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, \
-    QSpacerItem, QSizePolicy, QSplashScreen
+from PyQt5.QtCore import QObject, QRect, QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QComboBox, \
+    QSpacerItem, QSizePolicy, QSplashScreen, QSlider, QLabel
 
 
 # SplashScreen class to display an animated splash screen
@@ -29,153 +48,628 @@ class SplashScreen(QSplashScreen):
         self.setPixmap(QPixmap(self.animation_frames[self.current_frame]))
 
 
-# Widget to display a histogram
-class HistogramWidget(QWidget):
-    def __init__(self):
+# Rasterises histogram bins into a reusable RGBA QImage in one NumPy pass
+class HistogramRenderer:
+    STYLES = ("filled", "line", "log")
+    LOG_RANGE = 1000.0  # dynamic range shown by the log style
+
+    def __init__(self, width, height, column_colors, segment_width=None, style="filled"):
+        if style not in self.STYLES:
+            raise ValueError("Unknown histogram style", style)
+        self.width = width
+        self.height = height
+        self.style = style
+        self.column_colors = np.asarray(column_colors, dtype=np.uint8).reshape(1, width, 4)
+        self.segment_width = segment_width or width  # line style does not join separate channels
+        self.rows = np.arange(height, dtype=np.int32).reshape(-1, 1)
+        self.buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        self.image = QImage(self.buffer.data, width, height, width * 4, QImage.Format_RGBA8888)
+        self.bins = None
+
+    # Update the bins; returns True when the image changed and the widget needs a repaint
+    def render(self, bins):
+        bins = np.asarray(bins, dtype=np.float32).reshape(-1)
+        if self.bins is not None and np.array_equal(bins, self.bins):
+            return False
+        self.bins = bins.copy()
+        self._rasterise()
+        return True
+
+    # Switch the drawing style and redraw the cached bins
+    def set_style(self, style):
+        if style not in self.STYLES:
+            raise ValueError("Unknown histogram style", style)
+        if style == self.style:
+            return False
+        self.style = style
+        if self.bins is not None:
+            self._rasterise()
+        return True
+
+    # Draw the bins into the image buffer
+    def _rasterise(self):
+        peak = float(self.bins.max()) if self.bins.size else 0.0
+        if peak <= 0:
+            self.buffer.fill(0)
+            return
+        values = self.bins / peak
+        if self.style == "log":
+            values = np.log1p(values * self.LOG_RANGE) / np.log1p(self.LOG_RANGE)
+        tops = self.height - (values * self.height).astype(np.int32)
+
+        if self.style == "line":
+            tops = np.minimum(tops, self.height - 1)
+            previous = np.roll(tops, 1)
+            previous[::self.segment_width] = tops[::self.segment_width]
+            mask = (self.rows >= np.minimum(tops, previous)) & (self.rows <= np.maximum(tops, previous))
+        else:
+            mask = self.rows >= tops
+        np.multiply(mask[..., None], self.column_colors, out=self.buffer, casting="unsafe")
+
+
+# Rasterises a 2D count map (waveform, vectorscope) into an intensity image tinted per column
+class DensityRenderer:
+    def __init__(self, width, height, column_colors):
+        self.width = width
+        self.height = height
+        self.column_colors = np.asarray(column_colors, dtype=np.uint8).reshape(1, width, 3)
+        self.buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        self.buffer[..., :3] = self.column_colors
+        self.image = QImage(self.buffer.data, width, height, width * 4, QImage.Format_RGBA8888)
+        self.bins = None
+
+    # Replace the counts; square-root scaling keeps sparse traces visible next to dense ones
+    def render(self, counts):
+        counts = np.asarray(counts, dtype=np.float32)
+        self.bins = counts
+        peak = float(counts.max()) if counts.size else 0.0
+        if peak <= 0:
+            self.buffer[..., 3] = 0
+            return True
+        scaled = cv2.resize(counts, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        np.sqrt(scaled * (1.0 / peak), out=scaled)
+        np.multiply(scaled, 255.0, out=self.buffer[..., 3], casting="unsafe")
+        return True
+
+    # Density scopes have a single style
+    def set_style(self, style):
+        return False
+
+
+# Base for the translucent scope overlays: caches the background and draws a prerendered QImage
+class ScopeWidget(QWidget):
+    def __init__(self, width, height):
         super().__init__()
         self.setWindowFlags(Qt.FramelessWindowHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setFixedSize(width, height)
+        self.background = QPixmap(width, height)
+        self.background.fill(Qt.transparent)
+        painter = QPainter(self.background)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 180))
+        painter.drawRoundedRect(self.background.rect(), 5, 5)
+        painter.end()
+        self.renderer = None
+
+    # Change the drawing style of the scope
+    def set_style(self, style):
+        if self.renderer.set_style(style):
+            self.update()
+
+    # Paint the cached background and the rasterised scope
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.background)
+        if self.renderer is not None and self.renderer.bins is not None:
+            painter.drawImage(0, 0, self.renderer.image)
+
+
+# Widget to display a histogram
+class HistogramWidget(ScopeWidget):
+    def __init__(self):
+        super().__init__(256, 100)
         self.histogram = None
-        self.setFixedSize(256, 100)
+        levels = np.arange(256, dtype=np.uint8)
+        colors = np.stack([levels, levels, levels, np.full(256, 255, dtype=np.uint8)], axis=1)
+        self.renderer = HistogramRenderer(256, 100, colors)
 
-    # Set histogram data and update the widget
+    # Set histogram data and update the widget when the bins changed
     def set_histogram(self, histogram):
         self.histogram = histogram
+        if self.renderer.render(histogram):
+            self.update()
+
+
+# Widget to display RGB histograms
+class RGBWidget(ScopeWidget):
+    def __init__(self):
+        super().__init__(768, 100)
+        self.RGBhistograms = [None, None, None]
+        colors = np.zeros((768, 4), dtype=np.uint8)
+        colors[:, 3] = 255
+        for channel in range(3):
+            colors[channel * 256:(channel + 1) * 256, channel] = 255
+        self.renderer = HistogramRenderer(768, 100, colors, segment_width=256)
+
+    # Set RGB histograms data and update the widget when the bins changed
+    def set_histograms(self, RGBhistograms):
+        self.RGBhistograms = RGBhistograms[:3]
+        if any(hist is None for hist in self.RGBhistograms):
+            return
+        if self.renderer.render(np.concatenate(self.RGBhistograms)):
+            self.update()
+
+
+# Widget to display a luma waveform or an RGB parade, with level 255 at the top
+class WaveformWidget(ScopeWidget):
+    MODES = ("luma", "parade")
+
+    def __init__(self, width=512, height=160):
+        super().__init__(width, height)
+        self.mode = "luma"
+        self.renderers = {"luma": DensityRenderer(width, height, np.full((width, 3), (170, 255, 170)))}
+        parade = np.zeros((width, 3), dtype=np.uint8)
+        for channel in range(3):
+            parade[channel * width // 3:(channel + 1) * width // 3, channel] = 255
+            parade[channel * width // 3:(channel + 1) * width // 3, (channel + 1) % 3] = 60
+        self.renderers["parade"] = DensityRenderer(width, height, parade)
+        self.renderer = self.renderers["luma"]
+
+    # Switch between the luma waveform and the RGB parade
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise ValueError("Unknown waveform mode", mode)
+        self.mode = mode
+        self.renderer = self.renderers[mode]
         self.update()
 
-    # Paint the histogram
-    def paintEvent(self, event):
-        painter = QPainter(self)
+    # Set the level-by-column counts and repaint
+    def set_waveform(self, counts):
+        if self.renderer.render(counts[::-1]):
+            self.update()
+
+
+# Widget to display a vectorscope: Cb to the right, Cr up, with a cached graticule
+class VectorscopeWidget(ScopeWidget):
+    def __init__(self, size=180):
+        super().__init__(size, size)
+        self.renderer = DensityRenderer(size, size, np.full((size, 3), (200, 255, 200)))
+        painter = QPainter(self.background)
         painter.setRenderHint(QPainter.Antialiasing)
-        painter.setPen(Qt.NoPen)
-        painter.setBrush(QColor(0, 0, 0, 180))
-        painter.drawRoundedRect(self.rect(), 5, 5)
+        painter.setPen(QColor(255, 255, 255, 70))
+        margin = size // 20
+        painter.drawEllipse(margin, margin, size - 2 * margin, size - 2 * margin)
+        painter.drawLine(size // 2, margin, size // 2, size - margin)
+        painter.drawLine(margin, size // 2, size - margin, size // 2)
+        painter.end()
 
-        if self.histogram is not None and self.isVisible():
-            # Ensure max_value is a float scalar
-            max_value = float(np.max(self.histogram))
-            if max_value > 0:
-                for i in range(256):
-                    # Ensure self.histogram[i] is a scalar
-                    value = int(float(self.histogram[i].item()) * self.height() / max_value)
-                    painter.setPen(QColor(i, i, i))
-                    painter.drawLine(i, self.height(), i, self.height() - value)
+    # Set the Cr-by-Cb counts and repaint
+    def set_vectorscope(self, counts):
+        if self.renderer.render(counts[::-1]):
+            self.update()
 
 
-# Widget to display RGB histograms
-class RGBWidget(QWidget):
+# Translucent overlay listing the live pipeline metrics
+class StatsOverlayWidget(QWidget):
     def __init__(self):
         super().__init__()
-        self.setFixedSize(768, 100)
         self.setWindowFlags(Qt.FramelessWindowHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
-        self.RGBhistograms = [None, None, None]
+        self.setFixedSize(300, 230)
+        self.lines = []
 
-    # Set RGB histograms data
-    def set_histograms(self, RGBhistograms):
-        self.RGBhistograms = RGBhistograms[:3]
+    # Format a metrics snapshot into the lines shown on screen
+    def set_snapshot(self, snapshot):
+        lines = [
+            f"Display {snapshot['fps']:.1f} fps   Capture {snapshot['gauges'].get('capture_fps', 0.0):.1f} fps",
+            f"Latency {snapshot['latency']['mean_ms']:.1f} ms (p95 {snapshot['latency']['p95_ms']:.1f})",
+            f"GUI busy {snapshot['gui_busy_percent']:.0f}%   Dropped {int(snapshot['gauges'].get('capture_dropped_frames', 0))}",
+            f"Load {snapshot['gauges'].get('scheduler_load', 0.0) * 100:.0f}%   "
+            f"{FrameScheduler.LEVELS[int(snapshot['gauges'].get('degradation_level', 0))]}",
+        ]
+        for name, stage in snapshot["stages"].items():
+            lines.append(f"{name:<13}{stage['mean_ms']:6.2f} ms  p95 {stage['p95_ms']:6.2f}")
+        if "preroll_bytes" in snapshot["gauges"]:
+            lines.append(f"Pre-roll {snapshot['gauges']['preroll_seconds']:.1f} s  "
+                         f"{snapshot['gauges']['preroll_bytes'] / 1e6:.0f} MB  "
+                         f"dropped {int(snapshot['gauges'].get('preroll_dropped_frames', 0))}")
+        if snapshot["gauges"].get("recording"):
+            lines.append(f"Rec queue {int(snapshot['gauges'].get('record_queue_depth', 0))}   "
+                         f"dropped {int(snapshot['gauges'].get('record_dropped_frames', 0))}")
+        if "buffer_pool_buffers" in snapshot["gauges"]:
+            gauges = snapshot["gauges"]
+            lines.append(f"Buffers {int(gauges['buffer_pool_in_use'])}/{int(gauges['buffer_pool_buffers'])}  "
+                         f"peak {int(gauges['buffer_pool_high_water'])}  "
+                         f"{gauges['buffer_pool_pooled_bytes'] / 1e6:.0f} MB  "
+                         f"unpooled {int(gauges['buffer_pool_overflows'])}")
+        if "integrity_capture_frames" in snapshot["gauges"]:
+            gauges = snapshot["gauges"]
+            lines.append(f"Stamps lost {int(gauges['integrity_capture_dropped'])}  "
+                         f"dup {int(gauges['integrity_capture_duplicated'])}  "
+                         f"unshown {int(gauges['integrity_display_dropped'])}  "
+                         f"late {int(gauges['integrity_display_late'])}")
+        self.lines = lines
         self.update()
 
-    # Paint the RGB histograms
+    # Paint the metrics as monospaced text
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         painter.setPen(Qt.NoPen)
         painter.setBrush(QColor(0, 0, 0, 180))
         painter.drawRoundedRect(self.rect(), 5, 5)
+        painter.setPen(QColor(255, 255, 255))
+        font = painter.font()
+        font.setFamily("Monospace")
+        font.setPointSize(8)
+        painter.setFont(font)
+        line_height = painter.fontMetrics().height()
+        for index, line in enumerate(self.lines):
+            painter.drawText(8, 8 + (index + 1) * line_height, line)
 
-        if self.isVisible():
-            max_value = max((max(hist) for hist in self.RGBhistograms if hist is not None), default=0)
-            if max_value > 0:
-                for channel, hist in enumerate(self.RGBhistograms):
-                    if hist is not None:
-                        color = QColor(255, 0, 0) if channel == 0 else QColor(0, 255, 0) if channel == 1 else QColor(0,
-                                                                                                                     0,
-                                                                                                                     255)
-                        painter.setPen(color)
-                        for i in range(256):
-                            value = int(hist[i] * self.height() / max_value)
-                            painter.drawLine(i + channel * 256, self.height(), i + channel * 256, self.height() - value)
-
-
-# Widget to display the rule of thirds grid
-class RuleOfThirdsWidget(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.setWindowFlags(Qt.FramelessWindowHint)
-        self.setAttribute(Qt.WA_TranslucentBackground)
 
-    # Paint the rule of thirds grid lines
+# Presents video frames from a preallocated display-sized buffer wrapped by a reused QImage
+class VideoSurface(QWidget):
+    def __init__(self, width, height, parent=None, channel_order="rgb"):
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        # Frames are shown in their native channel order, so no colour swap is needed
+        self.image_format = QImage.Format_BGR888 if channel_order == "bgr" else QImage.Format_RGB888
+        self.background = QColor(17, 17, 17)
+        self.buffer = None
+        self.image = None
+        self.image_rect = QRect()
+        self.frames_presented = 0
+        self.metrics = None
+        self.on_region_selected = None  # called with (x, y, width, height) as picture fractions, or None on a click
+        self.drag_start = None
+
+    # Size of the picture for a frame, fitted inside the widget with its aspect ratio kept
+    def picture_size(self, frame_width, frame_height):
+        scale = min(self.width() / frame_width, self.height() / frame_height)
+        return max(1, int(frame_width * scale)), max(1, int(frame_height * scale))
+
+    # Display buffer for frames of the given size; reallocated only when the picture size changes
+    def display_buffer(self, frame_width, frame_height):
+        width, height = self.picture_size(frame_width, frame_height)
+        if self.buffer is None or self.buffer.shape[:2] != (height, width):
+            self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+            self.image = QImage(self.buffer.data, width, height, width * 3, self.image_format)
+            self.image_rect = QRect((self.width() - width) // 2, (self.height() - height) // 2, width, height)
+            self.update()
+        return self.buffer
+
+    # Scale a frame into the display buffer and return the buffer, so overlays can be drawn on it before commit()
+    def scale(self, frame):
+        buffer = self.display_buffer(frame.shape[1], frame.shape[0])
+        if frame is not buffer:
+            if frame.shape == buffer.shape:
+                np.copyto(buffer, frame)
+            else:
+                cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer
+
+    # Repaint only the picture area with the current buffer
+    def commit(self):
+        self.frames_presented += 1
+        self.update(self.image_rect)
+
+    # Scale a frame into the display buffer and show it
+    def present(self, frame):
+        self.scale(frame)
+        self.commit()
+
+    # Paint the letterbox and the current picture
     def paintEvent(self, event):
+        started = time.perf_counter()
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setPen(QColor(255, 255, 255, 180))
-        width = self.width()
-        height = self.height()
+        if not self.image_rect.contains(event.rect()):
+            painter.fillRect(event.rect(), self.background)
+        if self.image is not None:
+            painter.drawImage(self.image_rect.topLeft(), self.image)
+        painter.end()
+        if self.metrics is not None:
+            elapsed = time.perf_counter() - started
+            self.metrics.record("paint", elapsed)
+            self.metrics.add_busy(elapsed)
+
+    # Position inside the picture as fractions of its size, clamped to the picture
+    def picture_fraction(self, position):
+        rect = self.image_rect
+        if rect.width() <= 0 or rect.height() <= 0:
+            return None
+        return (min(max((position.x() - rect.left()) / rect.width(), 0.0), 1.0),
+                min(max((position.y() - rect.top()) / rect.height(), 0.0), 1.0))
+
+    # Start selecting a region when someone listens for one
+    def mousePressEvent(self, event):
+        if self.on_region_selected is not None:
+            self.drag_start = self.picture_fraction(event.pos())
+
+    # Report the dragged region; a click without dragging clears it
+    def mouseReleaseEvent(self, event):
+        start, self.drag_start = self.drag_start, None
+        end = self.picture_fraction(event.pos())
+        if self.on_region_selected is None or start is None or end is None:
+            return
+        left, top = min(start[0], end[0]), min(start[1], end[1])
+        width, height = abs(end[0] - start[0]), abs(end[1] - start[1])
+        self.on_region_selected((left, top, width, height) if width > 0.02 and height > 0.02 else None)
+
+
+# Multiview tile: a video surface with the source name, a small luma histogram and double-click to promote
+class MultiviewTile(VideoSurface):
+    def __init__(self, width, height, label, parent=None):
+        super().__init__(width, height, parent)
+        self.label = label
+        self.failed = False  # the last frame could not be processed; the label turns red until one can
+        self.on_double_click = None
+        levels = np.arange(256, dtype=np.uint8)
+        colors = np.stack([levels, levels, levels, np.full(256, 200, dtype=np.uint8)], axis=1)
+        self.histogram_renderer = HistogramRenderer(256, 40, colors)
+
+    # Update the tile's luma histogram
+    def set_histogram(self, histogram):
+        if histogram is not None and self.histogram_renderer.render(histogram):
+            self.update(self.image_rect)
+
+    # Mark the tile as failing or working again
+    def set_failed(self, failed):
+        if failed != self.failed:
+            self.failed = failed
+            self.update(self.image_rect)
+
+    # Paint the picture, then the label and histogram inside it
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        painter = QPainter(self)
+        painter.setPen(QColor(255, 64, 64) if self.failed else QColor(255, 255, 255))
+        painter.drawText(self.image_rect.left() + 8, self.image_rect.top() + 18,
+                         f"{self.label} (no picture)" if self.failed else self.label)
+        if self.histogram_renderer.bins is not None:
+            painter.drawImage(self.image_rect.left() + 4, self.image_rect.bottom() - 44, self.histogram_renderer.image)
+
+    # Promote this tile to the full-size view
+    def mouseDoubleClickEvent(self, event):
+        if self.on_double_click is not None:
+            self.on_double_click()
+
 
-        # Draw vertical lines
-        painter.drawLine(width // 3, 0, width // 3, height)
-        painter.drawLine(2 * width // 3, 0, 2 * width // 3, height)
-        # Draw horizontal lines
-        painter.drawLine(0, height // 3, width, height // 3)
-        painter.drawLine(0, 2 * height // 3, width, 2 * height // 3)
+# Grid showing every source at once; each source has its own capture thread and a shared
+# worker pool scales, analyses and peaks the frames at tile resolution
+class MultiviewWidget(QWidget):
+    GRIDS = {"2x2": (2, 2), "3x3": (3, 3)}
+    SPACING = 2
+
+    def __init__(self, width, height, capture_pool, parent=None, workers=None):
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.capture_pool = capture_pool
+        self.grid_layout = QGridLayout(self)
+        self.grid_layout.setContentsMargins(0, 0, 0, 0)
+        self.grid_layout.setSpacing(self.SPACING)
+        self.pool = ThreadPoolExecutor(max_workers=workers or max(1, min(4, os.cpu_count() or 1)),
+                                       thread_name_prefix="multiview")
+        self.tiles = []  # one entry per source: [source, capture, acquired, tile, engine, analyzer, pending future]
+        self.on_promote = None
+
+    # Fill the grid with the given sources; captures come from the shared pool, so an already-open
+    # source is never opened twice
+    def start(self, sources, grid="2x2"):
+        self.stop()
+        columns, rows = self.GRIDS[grid]
+        tile_width = (self.width() - self.SPACING * (columns - 1)) // columns
+        tile_height = (self.height() - self.SPACING * (rows - 1)) // rows
+        for index, source in enumerate(sources[:columns * rows]):
+            try:
+                capture = self.capture_pool.acquire(source)
+            except ValueError:
+                continue
+            # Labelled like the source selector, so a source that failed to open does not shift the numbering
+            position = len(self.tiles)
+            tile = MultiviewTile(tile_width, tile_height, f"Camera {index + 1}", self)
+            tile.on_double_click = lambda selected=source: self.promote(selected)
+            self.grid_layout.addWidget(tile, position // columns, position % columns)
+            self.tiles.append([source, capture, True, tile, FocusPeakingEngine(tier="full"),
+                               FrameAnalyzer(stride=2), None])
+
+    # Present finished tiles and queue the newest frame of every idle tile on the worker pool
+    def update_tiles(self, peaking=False, threshold=20, color=(255, 0, 0)):
+        for entry in self.tiles:
+            source, capture, acquired, tile, engine, analyzer, pending = entry
+            if pending is not None:
+                if not pending.done():
+                    continue
+                entry[6] = None
+                # A frame the worker failed on marks the tile instead of raising in the GUI thread
+                if pending.cancelled() or pending.exception() is not None:
+                    tile.set_failed(True)
+                else:
+                    picture, histogram = pending.result()
+                    tile.set_failed(False)
+                    tile.present(picture)
+                    tile.set_histogram(histogram)
+            captured = capture.read_latest()
+            if captured is not None:
+                size = tile.picture_size(captured.image.shape[1], captured.image.shape[0])
+                entry[6] = self.pool.submit(self.process_tile, captured.image, size, engine, analyzer,
+                                            peaking, threshold, color)
+
+    # Scale, analyse and peak one frame at tile resolution (runs on the worker pool; OpenCV releases the GIL)
+    @staticmethod
+    def process_tile(frame, size, engine, analyzer, peaking, threshold, color):
+        picture = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        analysis = analyzer.analyze(picture, luma=True, rgb=False)
+        if peaking:
+            engine.apply(picture, threshold, color)
+        return picture, analysis.luma_histogram
+
+    # Ask the owner to show a source full size
+    def promote(self, source):
+        if self.on_promote is not None:
+            self.on_promote(source)
+
+    # Hand a tile's pool reference over to the caller, who must release it to the pool
+    def take_capture(self, source):
+        for entry in self.tiles:
+            if entry[0] == source:
+                entry[2] = False
+                return entry[1]
+        return None
+
+    # Remove all tiles and return their captures to the pool
+    def stop(self):
+        for source, capture, acquired, tile, engine, analyzer, pending in self.tiles:
+            if pending is not None:
+                pending.cancel()
+            if acquired:
+                self.capture_pool.release(source)
+            self.grid_layout.removeWidget(tile)
+            tile.deleteLater()
+        self.tiles = []
+
+    # Stop the grid and the worker pool
+    def shutdown(self):
+        self.stop()
+        self.pool.shutdown(wait=False)
 
 
 # Main application class
 class App(QWidget):
-    def __init__(self):
+    def __init__(self, capture=None, metrics_path=None, metrics_interval=5.0, snapshot_format="jpeg",
+                 snapshot_quality=95, snapshot_size=None, burst_frames=10, preroll_seconds=5.0,
+                 preroll_memory=256 * 1024 * 1024, preroll_quality=80, preroll_compress=True, zebra_level=95.0,
+                 load_shedding=True, analysis_workers=0, record_dir="/ScreenShots", record_codec="mp4v",
+                 segment_seconds=None, segment_bytes=None, review_cache_bytes=512 * 1024 * 1024, stream_port=None,
+                 stream_size=None, stream_fps=15.0, stream_qualities=(80,), sources=None, check_integrity=False,
+                 late_after=0.1, focus_grid=(8, 6), focus_metric="laplacian", focus_roi=None, focus_workers=None,
+                 preroll_workers=None):
         super().__init__()
-        # Initialize the splash screen
-        splash_screen = SplashScreen(["SplashScreen2.jpg"])
-        splash_screen.show()
-        QTimer.singleShot(5000, lambda: splash_screen.close())  # Close splash screen after 5 seconds
+        # Initialize the splash screen; it closes as soon as the first frame is on screen
+        self.splash_screen = SplashScreen(["SplashScreen2.jpg"])
+        self.splash_screen.show()
+        QTimer.singleShot(10000, self.close_splash_screen)  # Fallback when no camera delivers a frame
 
         self.setWindowTitle("Hyper-Vision")
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.CustomizeWindowHint | Qt.WindowTitleHint)
         self.showFullScreen()
         self.setStyleSheet("background-color: #111111;")
-        self.video_sources = self.detect_video_sources()
+        # An injected capture (benchmarks, tests) replaces camera discovery; otherwise start from the cached
+        # device list and probe the real devices in the background
+        self.discovery = None
+        if capture is not None:
+            self.video_sources = [capture.video_source]
+        elif sources:
+            self.video_sources = list(sources)
+        else:
+            self.discovery = VideoSourceDiscovery()
+            self.video_sources = [device["index"] for device in self.discovery.load_cache()]
+            self.discovery.start()
+        self.metrics = PipelineMetrics()
+        # Recently used sources stay open and reading so switching between them is near-instant
+        self.capture_pool = CapturePool(max_size=3, idle_timeout=120.0)
         self.histogram_widget = HistogramWidget()
         self.RGBhistogram_widget = RGBWidget()
-        self.rule_of_thirds_widget = RuleOfThirdsWidget()
+        self.waveform_widget = WaveformWidget()
+        self.vectorscope_widget = VectorscopeWidget()
+        self.stats_widget = StatsOverlayWidget()
         self.video_counter = 1
-        self.photo_counter = 1
+        self.record_dir = record_dir
+        self.record_codec = record_codec
+        self.segment_seconds = segment_seconds  # roll recordings over to a new file after this long or this size
+        self.segment_bytes = segment_bytes
+        self.last_recording = None  # index of the newest recording, opened by review mode
+        self.review_cache_bytes = review_cache_bytes
+        self.review_player = None  # ClipPlayer standing in for the live capture while reviewing
+        self.live_capture = None  # live capture kept open during review so going back is instant
+        self.review_failures_shown = 0
+        self.snapshots = SnapshotWriter(record_dir, fmt=snapshot_format, quality=snapshot_quality, size=snapshot_size)
+        self.snapshots.metrics = self.metrics
+        self.burst_frames = burst_frames
+        self.presented = None  # captured frame currently on screen, used for stills
+        self.recording = False
+        self.out = None
+        # The seconds before Record is pressed are kept so recordings include them; 0 seconds disables it
+        self.preroll = None
+        self.preroll_warned = False
+        if preroll_seconds > 0:
+            self.preroll = PreRollBuffer(preroll_seconds, preroll_memory, preroll_quality, preroll_compress,
+                                         workers=preroll_workers)
+            self.preroll.metrics = self.metrics
         self.setup_ui()
 
-        self.selected_video_source = self.video_sources[0]
-        self.vid = MyVideoCapture(self.selected_video_source)
+        self.selected_video_source = self.video_sources[0] if self.video_sources else None
+        self.vid = None
+        self.video_surface.metrics = self.metrics
+        self.pool_timer = QTimer()
+        self.pool_timer.timeout.connect(self.capture_pool.evict_idle)
+        self.pool_timer.start(5000)
         self.fps = 60
         self.delay = int(1000 / self.fps)
 
+        # Threaded captures drive update_frame as frames arrive; the timer only polls sources that cannot
+        # announce frames (unthreaded captures) and the multiview grid
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
-        self.timer.start(self.delay)
+        self.scheduler = FrameScheduler(default_interval=1.0 / self.fps, adaptive=load_shedding)
+        self.scheduler.frame_ready.connect(self.update_frame, Qt.QueuedConnection)
+        self.scheduler.on_level_changed = self.apply_degradation
+
+        self.analyzer = FrameAnalyzer(stride=4, interval=2, scope_rate=30.0)
 
         self.threshold_value = 20
         self.focus_peaking_color = (255, 0, 0)
+        self.peaking_tier = "display"  # chosen tier; the scheduler may run peaking cheaper under load
+        self.peaking_engine = FocusPeakingEngine(detector="laplacian", tier=self.peaking_tier)
+        self.compositor = OverlayCompositor(self.peaking_engine, zebra_level=zebra_level)
+        # Per-tile sharpness scores for the focus map overlay and its peak readout
+        self.focus_map = FocusMap(focus_grid[0], focus_grid[1], metric=focus_metric, roi=focus_roi,
+                                  workers=focus_workers)
+        # Optional worker processes take the analysis and peaking masks off the GUI process
+        self.analysis_pool = AnalysisProcessPool(analysis_workers) if analysis_workers > 0 else None
+        self.remote_peaking_mask = None
+        # Optional network feed of the composited picture for monitors on the local network
+        self.stream = None
+        if stream_port is not None:
+            self.stream = MonitorStream(stream_port, size=stream_size, fps=stream_fps, qualities=stream_qualities)
+
+        # Frame stamps of synthetic sources are checked as frames arrive and again as they are shown
+        self.capture_integrity = None
+        self.display_integrity = None
+        if check_integrity:
+            FRAME_BUFFERS.checking = True
+            self.capture_integrity = FrameIntegrityChecker(late_after)
+            self.display_integrity = FrameIntegrityChecker(late_after)
+
+        if capture is not None:
+            self.set_capture(capture)
+        elif sources:
+            self.set_capture(self.capture_pool.acquire(self.selected_video_source))
+        else:
+            self.discovery_timer = QTimer()
+            self.discovery_timer.timeout.connect(self.poll_discovery)
+            self.discovery_timer.start(20)
+        self.update_timer()
 
-        self.recording = False
-        self.out = None
         self.output_path = self.generate_video_path()
 
+        # Refresh the stats overlay and export the metrics without touching the per-frame path
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.refresh_stats)
+        self.stats_timer.start(500)
+        self.metrics_exporter = MetricsExporter(self.metrics, metrics_path) if metrics_path else None
+        if self.metrics_exporter is not None:
+            self.metrics_export_timer = QTimer()
+            self.metrics_export_timer.timeout.connect(self.export_metrics)
+            self.metrics_export_timer.start(int(metrics_interval * 1000))
+
     # Generate file path for saving video
     def generate_video_path(self):
-        return f"/ScreenShots/Video{self.video_counter}.mov"  # Set path for video to be
-        # saved
-
-    # Generate file path for saving photo
-    def generate_photo_path(self):
-        return f"/ScreenShots/Photo{self.photo_counter}.jpg"  # Set path for photo to be
-        # saved
-
-    # Apply red border to indicate recording
-    def apply_tally_border(self, frame):
-        border_thickness = 10
-        color = (0, 0, 255)  # BGR color for red
-        frame_with_border = frame.copy()
-        height, width = frame.shape[:2]
-        cv2.rectangle(frame_with_border, (0, 0), (width, height), color, thickness=border_thickness)
-        return frame_with_border
+        # The recording writer adds the extension for the codec and any segment numbers
+        return os.path.join(self.record_dir, f"Video{self.video_counter}")
 
     # Handle window close event
     def closeEvent(self, event):
@@ -183,8 +677,32 @@ class App(QWidget):
             self.histogram_widget.close()
         if self.RGBhistogram_widget.isVisible():
             self.RGBhistogram_widget.close()
+        if self.waveform_widget.isVisible():
+            self.waveform_widget.close()
+        if self.vectorscope_widget.isVisible():
+            self.vectorscope_widget.close()
+        if self.stats_widget.isVisible():
+            self.stats_widget.close()
         if self.recording:
             self.stop_recording()
+        self.stop_review()
+        self.multiview.shutdown()
+        if self.vid is not None:
+            self.vid.release()
+        self.capture_pool.clear()
+        if self.discovery is not None:
+            self.discovery.release_unused()
+        self.snapshots.close()
+        if self.preroll is not None:
+            self.preroll.close()
+        if self.analysis_pool is not None:
+            self.analysis_pool.close()
+        if self.stream is not None:
+            self.stream.close()
+        self.focus_map.close()
+        # A last export so short runs (soak tests ending with --run-seconds) still leave their final numbers
+        if self.metrics_exporter is not None:
+            self.export_metrics()
         event.accept()
 
     # Setup the user interface
@@ -217,9 +735,14 @@ class App(QWidget):
         """
 
         # Display area for the video feed
-        self.video_label = QLabel(self)
-        self.video_label.setFixedSize(1366, 768)
-        video_and_controls_layout.addWidget(self.video_label, alignment=Qt.AlignCenter)
+        self.video_surface = VideoSurface(1366, 768, self)
+        video_and_controls_layout.addWidget(self.video_surface, alignment=Qt.AlignCenter)
+
+        # Grid of all sources, shown in place of the video surface
+        self.multiview = MultiviewWidget(1366, 768, self.capture_pool, self)
+        self.multiview.on_promote = self.promote_tile
+        self.multiview.hide()
+        video_and_controls_layout.addWidget(self.multiview, alignment=Qt.AlignCenter)
 
         control_layout = QHBoxLayout()
         control_layout.addItem(QSpacerItem(80, 70, QSizePolicy.Expanding, QSizePolicy.Minimum))
@@ -240,14 +763,28 @@ class App(QWidget):
         self.source_combobox.setStyleSheet(combobox_stylesheet)
         control_layout.addWidget(self.source_combobox)
 
+        # Combobox to switch between the single view and the multiview grids
+        self.view_combobox = QComboBox()
+        self.view_combobox.addItems(["Single View", "Grid 2x2", "Grid 3x3"])
+        self.view_combobox.currentIndexChanged.connect(self.change_view_mode)
+        self.view_combobox.setFixedSize(108, 30)
+        self.view_combobox.setStyleSheet(combobox_stylesheet)
+        control_layout.addWidget(self.view_combobox)
+
         # Button to take a snapshot
         self.snapshot_btn = QPushButton("Photo")
-        self.snapshot_btn.setCheckable(True)
         self.snapshot_btn.clicked.connect(self.snapshot)
         self.snapshot_btn.setFixedSize(108, 30)
         control_layout.addWidget(self.snapshot_btn)
         self.snapshot_btn.setStyleSheet(button_stylesheet)
 
+        # Button to grab a burst of consecutive frames
+        self.burst_btn = QPushButton("Burst")
+        self.burst_btn.clicked.connect(self.burst)
+        self.burst_btn.setFixedSize(108, 30)
+        control_layout.addWidget(self.burst_btn)
+        self.burst_btn.setStyleSheet(button_stylesheet)
+
         # Button to start/stop recording
         self.record_btn = QPushButton("Record")
         self.record_btn.setCheckable(True)
@@ -256,6 +793,20 @@ class App(QWidget):
         control_layout.addWidget(self.record_btn)
         self.record_btn.setStyleSheet(button_stylesheet)
 
+        # Button to review the last recording in place of the live picture, and the scrub bar it shows
+        self.review_btn = QPushButton("Review")
+        self.review_btn.setCheckable(True)
+        self.review_btn.setFixedSize(108, 30)
+        self.review_btn.toggled.connect(self.toggle_review)
+        control_layout.addWidget(self.review_btn)
+        self.review_btn.setStyleSheet(button_stylesheet)
+
+        self.review_slider = QSlider(Qt.Horizontal)
+        self.review_slider.setFixedSize(108, 30)
+        self.review_slider.sliderMoved.connect(self.scrub)
+        control_layout.addWidget(self.review_slider)
+        self.review_slider.hide()
+
         # Button to enable/disable focus peaking
         self.focus_peaking_btn = QPushButton("Focus Peaking")
         self.focus_peaking_btn.setCheckable(True)
@@ -274,6 +825,22 @@ class App(QWidget):
         self.color_combobox.setStyleSheet(combobox_stylesheet)
         control_layout.addWidget(self.color_combobox)
 
+        # Comboboxes to choose the focus peaking detector and the resolution it runs at
+        self.peaking_detector_combobox = QComboBox()
+        self.peaking_detector_combobox.addItems(["Laplacian", "Sobel", "DoG"])
+        self.peaking_detector_combobox.currentIndexChanged.connect(self.change_peaking_detector)
+        self.peaking_detector_combobox.setFixedSize(108, 30)
+        self.peaking_detector_combobox.setStyleSheet(combobox_stylesheet)
+        control_layout.addWidget(self.peaking_detector_combobox)
+
+        self.peaking_tier_combobox = QComboBox()
+        self.peaking_tier_combobox.addItems(["Full Res", "Display Res", "Half Res", "Quarter Res"])
+        self.peaking_tier_combobox.setCurrentIndex(1)
+        self.peaking_tier_combobox.currentIndexChanged.connect(self.change_peaking_tier)
+        self.peaking_tier_combobox.setFixedSize(108, 30)
+        self.peaking_tier_combobox.setStyleSheet(combobox_stylesheet)
+        control_layout.addWidget(self.peaking_tier_combobox)
+
         # Buttons to adjust focus peaking threshold
         self.increase_threshold_btn = QPushButton("Decrease Peaking")
         self.increase_threshold_btn.clicked.connect(self.increase_threshold)
@@ -303,12 +870,63 @@ class App(QWidget):
         control_layout.addWidget(self.toggle_RGBhistogram_btn)
         self.toggle_RGBhistogram_btn.setStyleSheet(button_stylesheet)
 
+        # Combobox to change how the histograms are drawn
+        self.histogram_style_combobox = QComboBox()
+        self.histogram_style_combobox.addItems(["Filled", "Line", "Log"])
+        self.histogram_style_combobox.currentIndexChanged.connect(self.change_histogram_style)
+        self.histogram_style_combobox.setFixedSize(108, 30)
+        self.histogram_style_combobox.setStyleSheet(combobox_stylesheet)
+        control_layout.addWidget(self.histogram_style_combobox)
+
+        # Combobox to show the waveform monitor as a luma waveform or an RGB parade
+        self.waveform_combobox = QComboBox()
+        self.waveform_combobox.addItems(["Waveform Off", "Luma Waveform", "RGB Parade"])
+        self.waveform_combobox.currentIndexChanged.connect(self.change_waveform_mode)
+        self.waveform_combobox.setFixedSize(108, 30)
+        self.waveform_combobox.setStyleSheet(combobox_stylesheet)
+        control_layout.addWidget(self.waveform_combobox)
+
+        self.toggle_vectorscope_btn = QPushButton("Vectorscope")
+        self.toggle_vectorscope_btn.clicked.connect(self.toggle_vectorscope)
+        self.toggle_vectorscope_btn.setFixedSize(108, 30)
+        control_layout.addWidget(self.toggle_vectorscope_btn)
+        self.toggle_vectorscope_btn.setStyleSheet(button_stylesheet)
+
+        self.toggle_stats_btn = QPushButton("Stats")
+        self.toggle_stats_btn.clicked.connect(self.toggle_stats)
+        self.toggle_stats_btn.setFixedSize(108, 30)
+        control_layout.addWidget(self.toggle_stats_btn)
+        self.toggle_stats_btn.setStyleSheet(button_stylesheet)
+
+        # Buttons to toggle the exposure overlays
+        self.zebras_btn = QPushButton("Zebras")
+        self.zebras_btn.setCheckable(True)
+        self.zebras_btn.clicked.connect(self.toggle_zebras)
+        self.zebras_btn.setFixedSize(108, 30)
+        control_layout.addWidget(self.zebras_btn)
+        self.zebras_btn.setStyleSheet(button_stylesheet)
+
+        self.false_color_btn = QPushButton("False Color")
+        self.false_color_btn.setCheckable(True)
+        self.false_color_btn.clicked.connect(self.toggle_false_color)
+        self.false_color_btn.setFixedSize(108, 30)
+        control_layout.addWidget(self.false_color_btn)
+        self.false_color_btn.setStyleSheet(button_stylesheet)
+
         self.toggle_thirds_grid_btn = QPushButton("Compose")
         self.toggle_thirds_grid_btn.clicked.connect(self.toggle_thirds_grid)
         self.toggle_thirds_grid_btn.setFixedSize(108, 30)
         control_layout.addWidget(self.toggle_thirds_grid_btn)
         self.toggle_thirds_grid_btn.setStyleSheet(button_stylesheet)
 
+        # Button to show the focus map; dragging over the picture then limits it to a region
+        self.focus_map_btn = QPushButton("Focus Map")
+        self.focus_map_btn.setCheckable(True)
+        self.focus_map_btn.clicked.connect(self.toggle_focus_map)
+        self.focus_map_btn.setFixedSize(108, 30)
+        control_layout.addWidget(self.focus_map_btn)
+        self.focus_map_btn.setStyleSheet(button_stylesheet)
+
         # Exit button to close the application
         self.exit_button = QPushButton("Exit App")
         self.exit_button.clicked.connect(QApplication.instance().quit)
@@ -318,12 +936,27 @@ class App(QWidget):
 
         control_layout.addStretch(0)
         video_and_controls_layout.addLayout(control_layout)
+
+        # Status line for errors such as a recording that could not start; cleared after a few seconds
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: #ff5555; font-family: Orbitron; font-size: 10pt;")
+        self.status_label.hide()
+        video_and_controls_layout.addWidget(self.status_label, alignment=Qt.AlignCenter)
+        self.status_timer = QTimer()
+        self.status_timer.setSingleShot(True)
+        self.status_timer.timeout.connect(self.status_label.hide)
         video_and_controls_layout.addStretch(1)
         main_layout.addLayout(video_and_controls_layout)
         main_layout.addStretch(1)
         self.setLayout(main_layout)
         self.hide_controls()
 
+    # Show a message in the status line for a few seconds
+    def show_status(self, message, seconds=8.0):
+        self.status_label.setText(message)
+        self.status_label.show()
+        self.status_timer.start(int(seconds * 1000))
+
     # Toggle visibility of menu controls
     def toggle_menu(self):
         if self.menu_btn.isChecked():
@@ -334,29 +967,55 @@ class App(QWidget):
     # Show menu controls
     def show_controls(self):
         self.source_combobox.show()
+        self.view_combobox.show()
         self.snapshot_btn.show()
+        self.burst_btn.show()
         self.record_btn.show()
+        self.review_btn.show()
+        self.review_slider.setVisible(self.review_player is not None)
         self.focus_peaking_btn.show()
         self.color_combobox.show()
+        self.peaking_detector_combobox.show()
+        self.peaking_tier_combobox.show()
         self.increase_threshold_btn.show()
         self.decrease_threshold_btn.show()
         self.toggle_histogram_btn.show()
         self.toggle_RGBhistogram_btn.show()
+        self.histogram_style_combobox.show()
+        self.waveform_combobox.show()
+        self.toggle_vectorscope_btn.show()
+        self.toggle_stats_btn.show()
+        self.zebras_btn.show()
+        self.false_color_btn.show()
         self.toggle_thirds_grid_btn.show()
+        self.focus_map_btn.show()
         self.exit_button.show()
 
     # Hide menu controls
     def hide_controls(self):
         self.source_combobox.hide()
+        self.view_combobox.hide()
         self.snapshot_btn.hide()
+        self.burst_btn.hide()
         self.record_btn.hide()
+        self.review_btn.hide()
+        self.review_slider.hide()
         self.focus_peaking_btn.hide()
         self.color_combobox.hide()
+        self.peaking_detector_combobox.hide()
+        self.peaking_tier_combobox.hide()
         self.increase_threshold_btn.hide()
         self.decrease_threshold_btn.hide()
         self.toggle_histogram_btn.hide()
         self.toggle_RGBhistogram_btn.hide()
+        self.histogram_style_combobox.hide()
+        self.waveform_combobox.hide()
+        self.toggle_vectorscope_btn.hide()
+        self.toggle_stats_btn.hide()
+        self.zebras_btn.hide()
+        self.false_color_btn.hide()
         self.toggle_thirds_grid_btn.hide()
+        self.focus_map_btn.hide()
         self.exit_button.hide()
 
     # Toggle visibility of the histogram widget
@@ -365,15 +1024,15 @@ class App(QWidget):
             self.histogram_widget.hide()
         else:
             self.histogram_widget.setVisible(True)
-            video_label_geometry = self.video_label.geometry()
+            video_surface_geometry = self.video_surface.geometry()
             histogram_widget_width = self.histogram_widget.width()
             histogram_widget_height = self.histogram_widget.height()
             offset_x = 72
             offset_y = 69
-            histogram_x = self.video_label.mapToGlobal(
-                video_label_geometry.bottomRight()).x() - histogram_widget_width - offset_x
-            histogram_y = self.video_label.mapToGlobal(
-                video_label_geometry.bottomRight()).y() - histogram_widget_height - offset_y
+            histogram_x = self.video_surface.mapToGlobal(
+                video_surface_geometry.bottomRight()).x() - histogram_widget_width - offset_x
+            histogram_y = self.video_surface.mapToGlobal(
+                video_surface_geometry.bottomRight()).y() - histogram_widget_height - offset_y
             self.histogram_widget.move(histogram_x, histogram_y)
 
     # Toggle visibility of the RGB histogram widget
@@ -382,117 +1041,468 @@ class App(QWidget):
             self.RGBhistogram_widget.hide()
         else:
             self.RGBhistogram_widget.setVisible(True)
-            video_label_geometry = self.video_label.geometry()
+            video_surface_geometry = self.video_surface.geometry()
             RGBhistogramwidget_width = self.RGBhistogram_widget.width()
             RGBhistogramwidget_height = self.RGBhistogram_widget.height()
             offset_x = 597
             offset_y = -38
-            RGBhistogram_x = video_label_geometry.bottomRight().x() - RGBhistogramwidget_width - offset_x
-            RGBhistogram_y = video_label_geometry.bottomRight().y() - RGBhistogramwidget_height - offset_y
+            RGBhistogram_x = video_surface_geometry.bottomRight().x() - RGBhistogramwidget_width - offset_x
+            RGBhistogram_y = video_surface_geometry.bottomRight().y() - RGBhistogramwidget_height - offset_y
             self.RGBhistogram_widget.move(RGBhistogram_x, RGBhistogram_y)
 
-    # Toggle visibility of the rule of thirds grid
-    def toggle_thirds_grid(self):
-        if self.rule_of_thirds_widget.isVisible():
-            self.rule_of_thirds_widget.hide()
+    # Show the waveform monitor in the chosen mode, or hide it
+    def change_waveform_mode(self, index):
+        if index == 0:
+            self.waveform_widget.hide()
+            return
+        self.waveform_widget.set_mode(WaveformWidget.MODES[index - 1])
+        if not self.waveform_widget.isVisible():
+            self.waveform_widget.setVisible(True)
+            # Bottom-left corner of the picture, opposite the histograms
+            bottom_left = self.video_surface.mapToGlobal(self.video_surface.rect().bottomLeft())
+            self.waveform_widget.move(bottom_left.x() + 20, bottom_left.y() - self.waveform_widget.height() - 20)
+
+    # Toggle visibility of the vectorscope
+    def toggle_vectorscope(self):
+        if self.vectorscope_widget.isVisible():
+            self.vectorscope_widget.hide()
         else:
-            self.rule_of_thirds_widget.setVisible(True)
-            self.rule_of_thirds_widget.resize(self.video_label.size())
-            video_label_geometry = self.video_label.geometry()
-            rule_of_thirds_widget_width = self.rule_of_thirds_widget.width()
-            rule_of_thirds_widget_height = self.rule_of_thirds_widget.height()
-            offset_x = 72
-            offset_y = 69
-            thirds_x = self.video_label.mapToGlobal(
-                video_label_geometry.bottomRight()).x() - rule_of_thirds_widget_width - offset_x
-            thirds_y = self.video_label.mapToGlobal(
-                video_label_geometry.bottomRight()).y() - rule_of_thirds_widget_height - offset_y
-            self.rule_of_thirds_widget.move(thirds_x, thirds_y)
-
-    # Detect available video sources (cameras)
-    def detect_video_sources(self):
-        available_sources = []
-        for i in range(3):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                available_sources.append(i)
-                cap.release()
-        return available_sources
+            self.vectorscope_widget.setVisible(True)
+            top_left = self.video_surface.mapToGlobal(self.video_surface.rect().topLeft())
+            self.vectorscope_widget.move(top_left.x() + 20, top_left.y() + 20)
+
+    # Toggle visibility of the performance stats overlay
+    def toggle_stats(self):
+        if self.stats_widget.isVisible():
+            self.stats_widget.hide()
+        else:
+            self.refresh_stats()
+            self.stats_widget.setVisible(True)
+            # Sit in the top-right corner of the picture, clear of the histograms along the bottom
+            top_right = self.video_surface.mapToGlobal(self.video_surface.rect().topRight())
+            self.stats_widget.move(top_right.x() - self.stats_widget.width() - 20, top_right.y() + 20)
+
+    # Sample counters owned by other components into the metrics
+    def collect_metrics(self):
+        self.metrics.set_gauge("snapshot_queue_depth", self.snapshots.queue_depth)
+        self.metrics.set_gauge("snapshots_saved", self.snapshots.saved)
+        self.metrics.set_gauge("degradation_level", self.scheduler.level)
+        self.metrics.set_gauge("scheduler_load", self.scheduler.load)
+        self.metrics.set_gauge("display_frames_shed", self.scheduler.shed_frames)
+        if self.analysis_pool is not None:
+            self.metrics.set_gauge("analysis_in_flight", self.analysis_pool.queue_depth)
+            self.metrics.set_gauge("analysis_skipped_frames", self.analysis_pool.skipped_frames)
+        if self.stream is not None:
+            self.metrics.set_gauge("stream_viewers", self.stream.viewer_count)
+            self.metrics.set_gauge("stream_encoded_frames", self.stream.encoded_frames)
+            self.metrics.set_gauge("stream_dropped_frames", self.stream.dropped_frames)
+        if self.focus_map_btn.isChecked() and self.focus_map.scores is not None:
+            self.metrics.set_gauge("focus_peak_sharpness", self.focus_map.peak)
+            self.metrics.set_gauge("focus_peak_hold", self.focus_map.peak_hold)
+            self.metrics.set_gauge("focus_tiles_rescored", self.focus_map.rescored_tiles)
+        for name, value in FRAME_BUFFERS.snapshot().items():
+            self.metrics.set_gauge(f"buffer_pool_{name}", value)
+        for stage, checker in (("capture", self.capture_integrity), ("display", self.display_integrity)):
+            if checker is not None:
+                for name, value in checker.snapshot().items():
+                    self.metrics.set_gauge(f"integrity_{stage}_{name}", value)
+        if self.preroll is not None:
+            self.metrics.set_gauge("preroll_bytes", self.preroll.total_bytes)
+            self.metrics.set_gauge("preroll_seconds", self.preroll.duration)
+            self.metrics.set_gauge("preroll_frames", self.preroll.frame_count)
+            self.metrics.set_gauge("preroll_dropped_frames", self.preroll.dropped_frames)
+            self.metrics.set_gauge("preroll_evicted_frames", self.preroll.evicted_frames)
+            # Gaps in the pre-roll would show up as repeated frames at the start of a recording, so say so once
+            if self.preroll.dropped_frames and not self.preroll_warned:
+                self.preroll_warned = True
+                self.show_status("Pre-roll encoding is falling behind; try --preroll-workers or "
+                                 "--preroll-uncompressed")
+        if self.vid is None:
+            return
+        self.metrics.set_gauge("capture_dropped_frames", self.vid.dropped_frames)
+        self.metrics.set_gauge("capture_fps", self.vid.measured_fps or 0.0)
+        self.metrics.set_gauge("recording", int(self.recording))
+        if self.recording:
+            self.metrics.set_gauge("record_queue_depth", self.out.queue_depth)
+            self.metrics.set_gauge("record_dropped_frames", self.out.dropped_frames)
+            self.metrics.set_gauge("record_bytes_written", self.out.bytes_written)
+        if self.review_player is not None:
+            self.metrics.set_gauge("review_failed_frames", self.review_player.failed_frames)
+
+    # Update the stats overlay while it is shown
+    def refresh_stats(self):
+        if self.stats_widget.isVisible():
+            self.collect_metrics()
+            self.stats_widget.set_snapshot(self.metrics.snapshot())
+
+    # Write the metrics to the export file
+    def export_metrics(self):
+        self.collect_metrics()
+        self.metrics_exporter.export()
+
+    # Change the drawing style of both histogram widgets
+    def change_histogram_style(self, index):
+        style = HistogramRenderer.STYLES[index]
+        self.histogram_widget.set_style(style)
+        self.RGBhistogram_widget.set_style(style)
+
+    # Toggle the rule of thirds grid, drawn into the picture by the compositor
+    def toggle_thirds_grid(self):
+        self.compositor.thirds = not self.compositor.thirds
+        self.update_frame()
+
+    # Toggle the focus map; while it is shown, dragging over the picture picks the region it covers
+    def toggle_focus_map(self):
+        enabled = self.focus_map_btn.isChecked()
+        self.focus_map.invalidate()
+        self.video_surface.on_region_selected = self.set_focus_region if enabled else None
+        self.update_frame()
+
+    # Limit the focus map to a region of the picture (fractions), or cover the whole picture again with None
+    def set_focus_region(self, roi):
+        self.focus_map.set_roi(roi)
+        self.update_frame()
+
+    # Toggle zebra stripes over areas at or above the zebra level
+    def toggle_zebras(self):
+        self.compositor.zebras = self.zebras_btn.isChecked()
+        self.update_frame()
+
+    # Toggle the false colour exposure view
+    def toggle_false_color(self):
+        self.compositor.false_color = self.false_color_btn.isChecked()
+        self.update_frame()
+
+    # Hand the first usable camera to the pipeline as soon as its probe finishes, then settle the source list
+    def poll_discovery(self):
+        finished = self.discovery.poll()
+        if self.vid is None:
+            source, cap = self.discovery.take_ready(self.selected_video_source)
+            if cap is not None:
+                self.selected_video_source = source
+                self.set_capture(self.capture_pool.acquire(source, capture=cap))
+
+        if finished:
+            self.discovery_timer.stop()
+            # The other cameras the probes opened are kept warm for switching
+            for source, cap in self.discovery.take_unused():
+                self.capture_pool.adopt(source, cap)
+            self.video_sources = self.discovery.sources()
+            self.discovery.save_cache()
+            self.source_combobox.blockSignals(True)
+            self.source_combobox.clear()
+            self.source_combobox.addItems([f"Camera {i + 1}" for i in range(len(self.video_sources))])
+            if self.selected_video_source in self.video_sources:
+                self.source_combobox.setCurrentIndex(self.video_sources.index(self.selected_video_source))
+            self.source_combobox.blockSignals(False)
+
+    # Close the splash screen once, either on the first frame or on the fallback timeout
+    def close_splash_screen(self):
+        if self.splash_screen is not None:
+            self.splash_screen.close()
+            self.splash_screen = None
+
+    # Make a capture the active source, moving frame listeners such as an active recording onto it
+    # and returning the previous capture to the pool
+    def set_capture(self, vid):
+        listeners = []
+        if self.vid is not None:
+            listeners = list(self.vid.listeners)
+            for listener in listeners:
+                self.vid.remove_listener(listener)
+            self.vid.metrics = None
+            if self.vid is not self.live_capture:
+                self.release_capture(self.vid)
+        # Switching to any other source ends review; the player was released along with the old capture
+        if self.review_player is not None and vid is not self.review_player:
+            if vid is not self.live_capture:
+                self.release_capture(self.live_capture)
+            self.review_player = None
+            self.live_capture = None
+            self.review_btn.blockSignals(True)
+            self.review_btn.setChecked(False)
+            self.review_btn.blockSignals(False)
+            self.review_slider.hide()
+        self.vid = vid
+        self.vid.metrics = self.metrics
+        for listener in listeners:
+            self.vid.add_listener(listener)
+        # Pre-roll from the previous source must never end up in a recording of this one
+        if self.preroll is not None and not self.recording:
+            self.preroll.clear()
+            if self.preroll.submit not in self.vid.listeners:
+                self.vid.add_listener(self.preroll.submit)
+        if self.capture_integrity is not None:
+            self.capture_integrity.reset()
+            self.display_integrity.reset()
+            if self.capture_integrity.check not in self.vid.listeners:
+                self.vid.add_listener(self.capture_integrity.check)
+        # Unthreaded captures read inside update_frame itself, so they are polled instead
+        if not getattr(self.vid, "threaded", False):
+            self.vid.remove_listener(self.scheduler.on_frame)
+        elif self.scheduler.on_frame not in self.vid.listeners:
+            self.vid.add_listener(self.scheduler.on_frame)
+        self.update_timer()
+
+    # Hand a capture back to the pool, or close it when the pool does not own it
+    def release_capture(self, vid):
+        if not self.capture_pool.release(vid.video_source):
+            vid.release()
+
+    # Poll with the timer only when frame arrival cannot drive the display
+    def update_timer(self):
+        polling = self.multiview.isVisible() or (self.vid is not None and not getattr(self.vid, "threaded", False))
+        if polling and not self.timer.isActive():
+            self.timer.start(self.delay)
+        elif not polling and self.timer.isActive():
+            self.timer.stop()
+
+    # Shed optional work for a degradation level: analysis first, then peaking resolution, then display rate.
+    # Recording is fed from the capture thread and never shed
+    def apply_degradation(self, level):
+        factor = 4 if level >= 1 else 1
+        self.analyzer.interval = 2 * factor
+        self.analyzer.scope_rate = 30.0 / factor
+        self.focus_map.interval = factor
+        tier = self.peaking_tier
+        if level >= 2:
+            tier = FocusPeakingEngine.TIERS[min(FocusPeakingEngine.TIERS.index(tier) + 1, len(FocusPeakingEngine.TIERS) - 1)]
+        self.peaking_engine.tier = tier
 
     # Change the video source based on the selected index
     def change_video_source(self, index):
         selected_video_source = self.video_sources[index]
-        self.vid = MyVideoCapture(selected_video_source)
+        if self.vid is not None and self.vid.video_source == selected_video_source:
+            return
+        try:
+            capture = self.capture_pool.acquire(selected_video_source)
+        except ValueError as error:
+            # A stale cached device or an unplugged camera must not take the monitor down; stay on the current one
+            self.source_combobox.blockSignals(True)
+            if self.selected_video_source in self.video_sources:
+                self.source_combobox.setCurrentIndex(self.video_sources.index(self.selected_video_source))
+            self.source_combobox.blockSignals(False)
+            self.show_status(f"Camera {index + 1} unavailable: {error}")
+            return
+        self.selected_video_source = selected_video_source
+        self.set_capture(capture)
+
+    # Switch between the single view and a multiview grid
+    def change_view_mode(self, index):
+        if index == 0:
+            self.multiview.stop()
+            self.multiview.hide()
+            self.video_surface.show()
+            self.update_timer()
+            return
+        self.multiview.start(self.video_sources, "2x2" if index == 1 else "3x3")
+        self.video_surface.hide()
+        self.multiview.show()
+        self.update_timer()
 
-    # Update the video frame displayed on the label
+    # Show a multiview tile full size, keeping its already-running capture
+    def promote_tile(self, source):
+        capture = self.multiview.take_capture(source)
+        if capture is self.vid:
+            # Already active; the tile's pool reference is not needed
+            self.capture_pool.release(source)
+        elif capture is not None:
+            self.selected_video_source = source
+            self.set_capture(capture)
+            self.source_combobox.blockSignals(True)
+            self.source_combobox.setCurrentIndex(self.video_sources.index(source))
+            self.source_combobox.blockSignals(False)
+        self.view_combobox.setCurrentIndex(0)
+
+    # Update the video frame displayed on the video surface
     def update_frame(self):
-        ret, frame = self.vid.get_frame()
+        if self.multiview.isVisible():
+            self.multiview.update_tiles(self.focus_peaking_btn.isChecked(), self.threshold_value,
+                                        self.focus_peaking_color)
+            return
+        if self.vid is None or not self.scheduler.begin():
+            return
+        started = time.perf_counter()
+        # Pick up the newest captured frame; nothing to do until the reader thread delivers one
+        captured = self.vid.read_latest()
+        ret = captured is not None
+        frame = captured.image if ret else None
 
         if ret:
-            frame.copy()
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-            histogram = cv2.calcHist([gray_frame], [0], None, [256], [0, 256])
-            self.histogram_widget.set_histogram(histogram)
-
-            # Calculate histograms for Red, Green, and Blue channels
-            red_histogram = cv2.calcHist([frame], [0], None, [256], [0, 256]).reshape(-1)
-            green_histogram = cv2.calcHist([frame], [1], None, [256], [0, 256]).reshape(-1)
-            blue_histogram = cv2.calcHist([frame], [2], None, [256], [0, 256]).reshape(-1)
-            # Normalize histograms to values between 0 and 1
-            red_histogram /= np.max(red_histogram)
-            green_histogram /= np.max(green_histogram)
-            blue_histogram /= np.max(blue_histogram)
-
-            # Pass histograms to the RGB Parade widget
-            self.RGBhistogram_widget.set_histograms([red_histogram, green_histogram, blue_histogram])
+            # Scopes are only computed while their widgets are on screen
+            waveform = self.waveform_widget.mode if self.waveform_widget.isVisible() else None
+            if self.analysis_pool is not None and self.analysis_pool.broken:
+                self.stop_analysis_pool()
+            if self.analysis_pool is not None:
+                with self.metrics.stage("analysis"):
+                    # With peaking on, the frame shown is the one the newest mask belongs to, so the mask lines up
+                    captured = self.offload_analysis(captured, waveform)
+                ret = captured is not None
+                frame = captured.image if ret else None
+            else:
+                with self.metrics.stage("analysis"):
+                    analysis = self.analyzer.analyze(frame, luma=self.histogram_widget.isVisible(),
+                                                     rgb=self.RGBhistogram_widget.isVisible(), waveform=waveform,
+                                                     vectorscope=self.vectorscope_widget.isVisible())
+                self.show_analysis(analysis)
 
         if ret:
-            frame_with_effects = frame.copy()
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-            histogram = cv2.calcHist([gray_frame], [0], None, [256], [0, 256])
-            self.histogram_widget.set_histogram(histogram)
+            if self.focus_map_btn.isChecked():
+                with self.metrics.stage("focus_map"):
+                    self.focus_map.update(frame)
+            # Overlays are drawn into the display buffer only; raw frames reach the recording writer straight
+            # from the capture thread
+            self.display_frame(frame)
+            if self.review_player is not None:
+                self.review_slider.setValue(self.review_player.current_frame)
+                if self.review_player.failed_frames != self.review_failures_shown:
+                    self.review_failures_shown = self.review_player.failed_frames
+                    self.show_status(f"{self.review_failures_shown} frames of this clip could not be decoded")
+            elif self.display_integrity is not None:
+                self.display_integrity.check(captured)
+            self.metrics.frame_presented(captured.timestamp)
+            self.presented = captured
+            if self.splash_screen is not None:
+                self.close_splash_screen()
+            elapsed = time.perf_counter() - started
+            self.metrics.record("update_frame", elapsed)
+            self.scheduler.end(elapsed, getattr(self.vid, "frame_interval", None))
+        self.metrics.add_busy(time.perf_counter() - started)
+
+    # Pass analysis results to the scope widgets
+    def show_analysis(self, analysis):
+        if analysis is None:
+            return
+        if analysis.luma_histogram is not None:
+            self.histogram_widget.set_histogram(analysis.luma_histogram)
+        # Pass histograms to the RGB Parade widget
+        if analysis.rgb_histograms is not None:
+            self.RGBhistogram_widget.set_histograms(analysis.rgb_histograms)
+        if analysis.waveform is not None:
+            self.waveform_widget.set_waveform(analysis.waveform)
+        if analysis.vectorscope is not None:
+            self.vectorscope_widget.set_vectorscope(analysis.vectorscope)
 
-            if self.focus_peaking_btn.isChecked():
-                frame_with_effects = self.apply_focus_peaking(frame_with_effects)
+    # A worker process died (killed, out of memory): drop the pool and analyse in-process from now on
+    def stop_analysis_pool(self):
+        self.analysis_pool.close()
+        self.analysis_pool = None
+        self.remote_peaking_mask = None
+        self.metrics.count("analysis_pool_failures")
+        self.show_status("Analysis workers stopped; analysing in-process")
 
-            self.display_frame(frame_with_effects)
+    # Apply finished worker results and queue the current frame. Returns the frame to display: the current one,
+    # or with peaking on the newest frame whose mask has come back (None until one has)
+    def offload_analysis(self, captured, waveform):
+        peaked = None
+        for result in self.analysis_pool.results():
+            self.show_analysis(result["analysis"])
+            if result["focus"] is not None:
+                self.metrics.set_gauge("focus_edge_mean", result["focus"][0])
+                self.metrics.set_gauge("focus_peaking_fraction", result["focus"][1])
+            if result["peaking_mask"] is not None:
+                peaked = result
+        peaking = None
+        if self.focus_peaking_btn.isChecked():
+            display_size = (self.video_surface.width(), self.video_surface.height())
+            peaking = (self.threshold_value, self.peaking_engine.detector, self.peaking_engine.tier, display_size)
+        else:
+            self.remote_peaking_mask = None
+        options = {"stride": self.analyzer.stride, "luma": self.histogram_widget.isVisible(),
+                   "rgb": self.RGBhistogram_widget.isVisible(), "waveform": waveform,
+                   "vectorscope": self.vectorscope_widget.isVisible(), "peaking": peaking}
+        if peaking is not None or options["luma"] or options["rgb"] or waveform or options["vectorscope"]:
+            self.analysis_pool.submit(captured, options)
+        if peaking is None:
+            return captured
+        if peaked is None:
+            return None
+        self.remote_peaking_mask = AnalysisProcessPool.unpack_mask(peaked)
+        return peaked["captured"]
+
+    # Handle key press events, like taking a snapshot with space bar or a burst with B. While reviewing, the
+    # arrows step frames (ten with Shift), J/K/L shuttle backwards/pause/forwards and Home/End jump to the ends
+    def keyPressEvent(self, event):
+        key = event.key()
+        player = self.review_player
+        if key == Qt.Key_Space:
+            self.snapshot()
+        elif key == Qt.Key_B:
+            self.burst()
+        elif player is None:
+            return
+        elif key in (Qt.Key_Left, Qt.Key_Right):
+            step = 10 if event.modifiers() & Qt.ShiftModifier else 1
+            player.jog(step if key == Qt.Key_Right else -step)
+        elif key == Qt.Key_J:
+            player.shuttle_step(-1)
+        elif key == Qt.Key_K:
+            player.shuttle(0)
+        elif key == Qt.Key_L:
+            player.shuttle_step(1)
+        elif key == Qt.Key_Home:
+            player.jog(-player.frame_count)
+        elif key == Qt.Key_End:
+            player.jog(player.frame_count)
 
-            # Convert frame to BGR color format if focus peaking is turned off
-            if not self.focus_peaking_btn.isChecked():
-                frame_with_effects = cv2.cvtColor(frame_with_effects, cv2.COLOR_RGB2BGR)
+    # Enter or leave review mode
+    def toggle_review(self, checked):
+        if checked:
+            self.start_review()
+        else:
+            self.stop_review()
 
-            if self.recording:
-                frame_with_effects = self.apply_tally_border(frame_with_effects)
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                self.out.write(frame_rgb)
+    # Newest recording: the one made this session, otherwise the latest index in the recording directory
+    def find_last_recording(self):
+        if self.last_recording is not None and os.path.exists(self.last_recording):
+            return self.last_recording
+        try:
+            indexes = [os.path.join(self.record_dir, name) for name in os.listdir(self.record_dir)
+                       if name.endswith(".index.jsonl")]
+        except OSError:
+            return None
+        return max(indexes, key=os.path.getmtime) if indexes else None
 
-            self.display_frame(frame_with_effects)
+    # Play the last recording in place of the live picture; the live capture keeps running meanwhile
+    def start_review(self):
+        path = None if self.recording or self.vid is None else self.find_last_recording()
+        player = None
+        if path is not None:
+            try:
+                player = ClipPlayer(path, cache_bytes=self.review_cache_bytes)
+            except (ValueError, OSError):
+                player = None
+        if player is None:
+            self.review_btn.setChecked(False)
+            return
+        self.review_player = player
+        self.review_failures_shown = 0
+        self.live_capture = self.vid
+        self.set_capture(player)
+        self.review_slider.setRange(0, player.frame_count - 1)
+        self.review_slider.setValue(0)
+        self.review_slider.setVisible(self.review_btn.isVisible())
 
-            # Record the raw frame if recording is active
-            if self.recording:
-                # Convert the frame to BGR format for recording
-                recording_frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                self.out.write(recording_frame)
+    # Return to the live source
+    def stop_review(self):
+        if self.review_player is not None and self.live_capture is not None:
+            self.set_capture(self.live_capture)
 
-    # Handle key press events, like taking a snapshot with space bar
-    def keyPressEvent(self, event):
-        if event.key() == Qt.Key_Space:
-            self.snapshot()
+    # Seek the review player to the frame under the scrub bar
+    def scrub(self, value):
+        if self.review_player is not None:
+            self.review_player.speed = 0.0
+            self.review_player.seek(value)
 
-    # Capture a snapshot and save it to the specified location
+    # Save the frame currently on screen; encoding happens in the background
     def snapshot(self):
-        ret, frame = self.vid.get_frame()
+        if self.presented is not None:
+            self.snapshots.save(self.presented)
 
-        if ret:
-            target_resolution = (3840, 2160)
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            resized_frame = cv2.resize(frame_rgb, target_resolution)
-            save_dir = "/ScreenShots"  # Path where images will be saved
-            os.makedirs(save_dir, exist_ok=True)
-            filename = f"Photo{self.photo_counter}.jpg"
-            filepath = os.path.join(save_dir, filename)
-            cv2.imwrite(filepath, resized_frame)
-            self.photo_counter += 1
+    # Grab the next burst_frames captured frames and encode them once the burst is complete
+    def burst(self):
+        if self.vid is not None:
+            self.snapshots.start_burst(self.vid, self.burst_frames)
 
     # Toggle focus peaking effect
     def toggle_focus_peaking(self):
@@ -515,17 +1525,16 @@ class App(QWidget):
         self.focus_peaking_color = colors[index]
         self.update_frame()
 
-    # Apply focus peaking effect to the frame
-    def apply_focus_peaking(self, frame):
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        laplacian = cv2.Laplacian(gray_frame, cv2.CV_64F)
-        laplacian = np.uint8(np.absolute(laplacian))
-        _, binary_threshold = cv2.threshold(laplacian, self.threshold_value, 255, cv2.THRESH_BINARY)
-        color_outline = frame.copy()
-        color_outline[binary_threshold != 0] = self.focus_peaking_color
-        # Swap red and blue channels to fix color inversion
-        color_outline[:, :, [0, 2]] = color_outline[:, :, [2, 0]]
-        return color_outline
+    # Change the edge detector used for focus peaking
+    def change_peaking_detector(self, index):
+        self.peaking_engine.detector = FocusPeakingEngine.DETECTORS[index]
+        self.update_frame()
+
+    # Change the resolution focus peaking is computed at
+    def change_peaking_tier(self, index):
+        self.peaking_tier = FocusPeakingEngine.TIERS[index]
+        self.apply_degradation(self.scheduler.level)
+        self.update_frame()
 
     # Start or stop video recording
     def toggle_recording(self, checked):
@@ -536,41 +1545,779 @@ class App(QWidget):
 
     # Start recording video
     def start_recording(self):
+        if self.vid is None or self.review_player is not None:
+            self.record_btn.setChecked(False)
+            return
         self.output_path = self.generate_video_path()
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        self.out = cv2.VideoWriter(self.output_path, fourcc, 29.97, (int(self.vid.width), int(self.vid.height)))
+        fps = RecordingWriter.container_fps(self.vid.measured_fps)
+        try:
+            out = RecordingWriter(self.output_path, (int(self.vid.width), int(self.vid.height)), fps,
+                                  fourcc=self.record_codec, preroll=self.preroll,
+                                  segment_seconds=self.segment_seconds, segment_bytes=self.segment_bytes)
+        except (OSError, ValueError) as error:
+            # An unwritable directory or a codec the writer cannot open must not take the monitor down
+            self.out = None
+            self.record_btn.setChecked(False)
+            self.show_status(f"Recording failed: {error}")
+            return
+        self.out = out
+        self.out.metrics = self.metrics
+        self.vid.add_listener(self.out.submit)
+        # The writer now receives live frames, so the pre-roll can stop collecting until the recording ends
+        if self.preroll is not None:
+            self.vid.remove_listener(self.preroll.submit)
         self.recording = True
 
     # Stop recording video
     def stop_recording(self):
         if self.recording:
             self.recording = False
-            self.out.release()
+            self.vid.remove_listener(self.out.submit)
+            self.out.close()
+            self.last_recording = self.out.index_path
+            if self.preroll is not None:
+                self.vid.add_listener(self.preroll.submit)
             self.video_counter += 1
             self.output_path = self.generate_video_path()
 
-    # Display the frame on the video label
+    # Scale the frame into the display buffer, draw the enabled overlays over it in one pass and show it
     def display_frame(self, frame):
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with self.metrics.stage("display"):
+            buffer = self.video_surface.scale(frame)
+        with self.metrics.stage("overlay"):
+            self.compositor.compose(frame, buffer, peaking=self.focus_peaking_btn.isChecked(),
+                                    threshold=self.threshold_value, peaking_color=self.focus_peaking_color,
+                                    tally=self.recording, peaking_mask=self.remote_peaking_mask,
+                                    focus_map=self.focus_map if self.focus_map_btn.isChecked() else None)
+        if self.stream is not None:
+            with self.metrics.stage("stream"):
+                self.stream.publish(buffer)
+        self.video_surface.commit()
+
+
+# Probes camera indices in parallel and caches the device list on disk so startup never waits on missing devices
+class VideoSourceDiscovery:
+    def __init__(self, indices=range(3), timeout=3.0, cache_path=None):
+        self.indices = list(indices)
+        self.timeout = timeout
+        self.cache_path = cache_path or os.path.join(os.path.expanduser("~"), ".hypervision", "devices.json")
+        self.results = {}  # index -> (capture, capabilities), or None when the device could not be opened
+        self.finished = False
+        self.started = None
+        self.lock = threading.Lock()
+
+    # Device list and capabilities saved by the previous run
+    def load_cache(self):
+        try:
+            with open(self.cache_path) as handle:
+                return json.load(handle)["devices"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    # Save the devices found by this run
+    def save_cache(self):
+        devices = [dict(index=index, **self.results[index][1]) for index in self.sources()]
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "w") as handle:
+                json.dump({"devices": devices}, handle, indent=2)
+        except OSError:
+            pass
+
+    # Probe every index on its own thread
+    def start(self):
+        self.started = time.monotonic()
+        for index in self.indices:
+            threading.Thread(target=self._probe, args=(index,), name=f"probe-{index}", daemon=True).start()
+
+    # Open one device and read its capabilities
+    def _probe(self, index):
+        cap = cv2.VideoCapture(index)
+        result = None
+        if cap.isOpened():
+            result = (cap, {
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": cap.get(cv2.CAP_PROP_FPS),
+                "backend": cap.getBackendName(),
+            })
+        with self.lock:
+            if not self.finished:
+                self.results[index] = result
+                return
+        # Discovery already gave up on this device
+        cap.release()
+
+    # True once every probe has answered or the timeout has expired; never blocks
+    def poll(self):
+        with self.lock:
+            if not self.finished:
+                timed_out = time.monotonic() - self.started > self.timeout
+                self.finished = timed_out or len(self.results) == len(self.indices)
+            return self.finished
+
+    # Devices that opened, in index order
+    def sources(self):
+        with self.lock:
+            return [index for index in self.indices if self.results.get(index)]
+
+    # Take ownership of the open capture for the preferred device, or the lowest one once all lower probes answered
+    def take_ready(self, preferred=None):
+        with self.lock:
+            candidates = []
+            if preferred in self.indices:
+                if preferred not in self.results and not self.finished:
+                    return None, None  # keep waiting for the camera used last time
+                candidates.append(preferred)
+            for index in self.indices:
+                if index not in self.results and not self.finished:
+                    break
+                candidates.append(index)
+            for index in candidates:
+                result = self.results.get(index)
+                if result and result[0] is not None:
+                    self.results[index] = (None, result[1])
+                    return index, result[0]
+            return None, None
+
+    # Take ownership of every probed capture nobody took yet
+    def take_unused(self):
+        with self.lock:
+            unused = []
+            for index in self.indices:
+                result = self.results.get(index)
+                if result and result[0] is not None:
+                    unused.append((index, result[0]))
+                    self.results[index] = (None, result[1])
+            return unused
+
+    # Release probed captures nobody took
+    def release_unused(self):
+        with self.lock:
+            for index, result in self.results.items():
+                if result and result[0] is not None:
+                    result[0].release()
+                    self.results[index] = (None, result[1])
+
+
+# Keeps recently used sources open and pre-rolled, with an LRU size limit and idle-timeout eviction
+class CapturePool:
+    def __init__(self, max_size=3, idle_timeout=120.0):
+        self.max_size = max_size  # idle captures beyond this are closed, least recently used first
+        self.idle_timeout = idle_timeout  # seconds an unused capture stays open
+        self.entries = OrderedDict()  # source -> [MyVideoCapture, users, last used]
+
+    # Get a running capture for a source, opening it (or adopting an already-open cv2.VideoCapture) if needed
+    def acquire(self, source, capture=None):
+        entry = self.entries.get(source)
+        if entry is None:
+            entry = [MyVideoCapture(source, threaded=True, capture=capture), 0, time.monotonic()]
+            self.entries[source] = entry
+        elif capture is not None:
+            capture.release()
+        entry[1] += 1
+        entry[2] = time.monotonic()
+        self.entries.move_to_end(source)
+        self.trim()
+        return entry[0]
+
+    # Keep an already-open cv2.VideoCapture warm without using it yet
+    def adopt(self, source, capture):
+        if source in self.entries or self.idle_count() >= self.max_size:
+            capture.release()
+            return
+        self.entries[source] = [MyVideoCapture(source, threaded=True, capture=capture), 0, time.monotonic()]
+        self.entries.move_to_end(source, last=False)
+
+    # Give a capture back; it keeps running until evicted. Returns False when the source is not pooled
+    def release(self, source):
+        entry = self.entries.get(source)
+        if entry is None:
+            return False
+        entry[1] = max(0, entry[1] - 1)
+        entry[2] = time.monotonic()
+        self.trim()
+        return True
+
+    # Number of open captures nobody is using
+    def idle_count(self):
+        return sum(1 for capture, users, last_used in self.entries.values() if users == 0)
+
+    # Close idle captures beyond the size limit, least recently used first
+    def trim(self):
+        excess = self.idle_count() - self.max_size
+        for source in [source for source, entry in self.entries.items() if entry[1] == 0]:
+            if excess <= 0:
+                break
+            self.entries.pop(source)[0].release()
+            excess -= 1
+
+    # Close captures that have been idle for longer than the timeout
+    def evict_idle(self):
+        now = time.monotonic()
+        for source, (capture, users, last_used) in list(self.entries.items()):
+            if users == 0 and now - last_used > self.idle_timeout:
+                self.entries.pop(source)
+                capture.release()
+
+    # Close every pooled capture
+    def clear(self):
+        for capture, users, last_used in self.entries.values():
+            capture.release()
+        self.entries.clear()
+
+
+# Runs the display loop on frame arrival and sheds optional work when frames take longer than the frame interval.
+# Levels escalate after sustained overload and recover only after a longer stretch of headroom
+class FrameScheduler(QObject):
+    frame_ready = pyqtSignal()
+    LEVELS = ("full", "reduced analysis", "reduced peaking", "reduced display rate")
+
+    def __init__(self, default_interval=1.0 / 60, high_load=0.85, low_load=0.5, escalate_after=10,
+                 recover_after=120, adaptive=True):
+        super().__init__()
+        self.adaptive = adaptive  # False only measures the load and never sheds work
+        self.default_interval = default_interval  # budget when the capture has not measured its frame interval
+        self.high_load = high_load  # fraction of the budget above which a frame counts as overloaded
+        self.low_load = low_load  # fraction of the budget below which a frame counts as having headroom
+        self.escalate_after = escalate_after
+        self.recover_after = recover_after
+        self.level = 0
+        self.load = 0.0  # smoothed processing time / budget
+        self.pending = False
+        self.arrivals = 0
+        self.shed_frames = 0  # arrivals not displayed at the reduced display rate
+        self.overloaded = 0
+        self.relaxed = 0
+        self.on_level_changed = None
+
+    # Frame listener; runs on the capture thread and coalesces arrivals into one queued signal
+    def on_frame(self, captured):
+        if not self.pending:
+            self.pending = True
+            self.frame_ready.emit()
+
+    # Called before processing a frame; False means this frame is shed to lower the display rate
+    def begin(self):
+        self.pending = False
+        self.arrivals += 1
+        if self.level >= 3 and self.arrivals % 2:
+            self.shed_frames += 1
+            return False
+        return True
+
+    # Account for a processed frame and move between levels
+    def end(self, elapsed, frame_interval=None):
+        budget = (frame_interval or self.default_interval) * (2 if self.level >= 3 else 1)
+        self.load = 0.8 * self.load + 0.2 * (elapsed / budget)
+        if not self.adaptive:
+            return
+        if self.load > self.high_load:
+            self.overloaded += 1
+            self.relaxed = 0
+            if self.overloaded >= self.escalate_after and self.level < len(self.LEVELS) - 1:
+                self.set_level(self.level + 1)
+        elif self.load < self.low_load:
+            self.relaxed += 1
+            self.overloaded = 0
+            if self.relaxed >= self.recover_after and self.level > 0:
+                self.set_level(self.level - 1)
+        else:
+            self.overloaded = self.relaxed = 0
+
+    # Switch to a degradation level and let the owner adjust its work
+    def set_level(self, level):
+        self.level = level
+        self.overloaded = self.relaxed = 0
+        if self.on_level_changed is not None:
+            self.on_level_changed(level)
+
+
+# Reusable arrays keyed by shape and dtype, so the pipeline stages write into recycled destinations through
+# OpenCV's dst= parameters instead of allocating full frames every time.
+#
+# Ownership rule: a buffer is free again once the pool's own list holds its only reference, measured by its
+# reference count. Whoever keeps a frame's pixels must therefore keep the array itself, or a numpy view of it,
+# alive; a raw pointer (ctypes address, a QImage over the bytes) does not count and must not outlive the
+# array. Short-lived holders (the ring buffer, the recorder queue, the encoder pools) simply hold their
+# reference. Holders that keep frames for seconds (the review cache, bursts, the uncompressed pre-roll) call
+# detach() to take the buffer over, so it stops taking up a pool slot. Holders register with track(). With
+# checking on (--check-integrity), a buffer that looks free but is still held by one of them is counted as a
+# violation and left alone
+class BufferPool:
+    def __init__(self, max_bytes=1024 * 1024 * 1024, max_per_key=12):
+        self.max_bytes = max_bytes  # ceiling for the pooled memory; beyond it buffers are allocated unpooled
+        self.max_per_key = max_per_key
+        self.buffers = OrderedDict()  # (shape, dtype) -> arrays, least recently used key first
+        self.pooled_bytes = 0
+        self.allocations = 0  # buffers added to the pool
+        self.reuses = 0
+        self.overflows = 0  # buffers handed out unpooled because the pool was full
+        self.high_water = {}  # (shape, dtype) -> most buffers of that key in use at once
+        self.holders = weakref.WeakSet()  # objects holding frames, each with a held_buffers() method
+        self.checking = False  # cross-check free buffers against the holders; costs a scan per reuse
+        self.violations = 0  # buffers that looked free while a holder still had them
+        self.detached = 0
+        self.lock = threading.Lock()
+        probe = [np.empty(1)]
+        self.free_references = self._references(probe[0])
+
+    # Reference count of a buffer as seen from the pool; equal to free_references when nobody else holds it
+    @staticmethod
+    def _references(buffer):
+        return sys.getrefcount(buffer)
+
+    # An array of the given shape and dtype with undefined contents
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.buffers.setdefault(key, [])
+            self.buffers.move_to_end(key)
+            free = None
+            in_use = 0
+            for index in range(len(buffers)):
+                if self._references(buffers[index]) > self.free_references or self._held(buffers[index]):
+                    in_use += 1
+                elif free is None:
+                    free = index
+            self.high_water[key] = max(self.high_water.get(key, 0), in_use + 1)
+            if free is not None:
+                self.reuses += 1
+                return buffers[free]
+            buffer = np.empty(shape, dtype=dtype)
+            if len(buffers) < self.max_per_key and self._make_room(buffer.nbytes, key):
+                buffers.append(buffer)
+                self.pooled_bytes += buffer.nbytes
+                self.allocations += 1
+            else:
+                self.overflows += 1
+            return buffer
+
+    # Register an object that holds frames across threads, for the self-check
+    def track(self, holder):
+        self.holders.add(holder)
+
+    # Hand a buffer over to a long-lived holder; the pool forgets it and never hands it out again
+    def detach(self, buffer):
+        key = (buffer.shape, buffer.dtype.str)
+        with self.lock:
+            buffers = self.buffers.get(key, ())
+            for index in range(len(buffers)):
+                if buffers[index] is buffer:
+                    del buffers[index]
+                    self.pooled_bytes -= buffer.nbytes
+                    self.detached += 1
+                    break
+        return buffer
+
+    # Self-check of the ownership rule: True, counting a violation, when a tracked holder still has the buffer
+    def _held(self, buffer):
+        if not self.checking:
+            return False
+        for holder in list(self.holders):
+            for held in holder.held_buffers():
+                if held is buffer or held.base is buffer:
+                    self.violations += 1
+                    return True
+        return False
+
+    # Drop free buffers of other shapes, least recently used first, until nbytes more fit under the ceiling
+    def _make_room(self, nbytes, keep):
+        for key in list(self.buffers):
+            if self.pooled_bytes + nbytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            buffers = self.buffers[key]
+            for index in reversed(range(len(buffers))):
+                if self._references(buffers[index]) <= self.free_references:
+                    self.pooled_bytes -= buffers.pop(index).nbytes
+            if not buffers:
+                del self.buffers[key]
+        return self.pooled_bytes + nbytes <= self.max_bytes
+
+    # Pool statistics for the metrics export
+    def snapshot(self):
+        with self.lock:
+            in_use = sum(1 for buffers in self.buffers.values() for index in range(len(buffers))
+                         if self._references(buffers[index]) > self.free_references)
+            return {
+                "buffers": sum(len(buffers) for buffers in self.buffers.values()),
+                "in_use": in_use,
+                "high_water": sum(self.high_water.values()),
+                "high_water_bytes": sum(count * int(np.prod(shape)) * np.dtype(dtype).itemsize
+                                        for (shape, dtype), count in self.high_water.items()),
+                "pooled_bytes": self.pooled_bytes,
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "overflows": self.overflows,
+                "detached": self.detached,
+                "violations": self.violations,
+            }
+
+
+# Pool shared by every stage of the frame pipeline
+FRAME_BUFFERS = BufferPool()
+
+
+# Frame delivered by MyVideoCapture, tagged with its sequence number and capture time
+class CapturedFrame:
+    __slots__ = ("image", "sequence", "timestamp")
+
+    def __init__(self, image, sequence, timestamp):
+        self.image = image
+        self.sequence = sequence
+        self.timestamp = timestamp
+
+
+# Small ring buffer handing frames from the capture thread to the GUI thread
+class FrameRingBuffer:
+    DROP_POLICIES = ("latest", "fifo")
+
+    def __init__(self, capacity=2, drop_policy="latest"):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError("Unknown drop policy", drop_policy)
+        self.capacity = max(1, int(capacity))
+        self.drop_policy = drop_policy
+        self.frames = deque()
+        self.last_frame = None
+        self.dropped_frames = 0
+        self.lock = threading.Lock()
+        FRAME_BUFFERS.track(self)
+
+    # Images of the frames held, for the buffer pool's self-check
+    def held_buffers(self):
+        with self.lock:
+            frames = list(self.frames) + ([self.last_frame] if self.last_frame is not None else [])
+        return [frame.image for frame in frames]
+
+    # Store a new frame, overwriting the oldest one when the buffer is full
+    def put(self, frame):
+        with self.lock:
+            if len(self.frames) >= self.capacity:
+                self.frames.popleft()
+                self.dropped_frames += 1
+            self.frames.append(frame)
+            self.last_frame = frame
+
+    # Take the next frame without blocking; "latest" discards everything older than the newest frame
+    def get(self):
+        with self.lock:
+            if not self.frames:
+                return None
+            if self.drop_policy == "latest":
+                frame = self.frames.pop()
+                self.dropped_frames += len(self.frames)
+                self.frames.clear()
+                return frame
+            return self.frames.popleft()
+
+    # Return the most recently captured frame without consuming it
+    def peek(self):
+        with self.lock:
+            return self.last_frame
+
+    # Number of frames waiting to be consumed
+    def __len__(self):
+        with self.lock:
+            return len(self.frames)
+
+
+# Frame counter and timestamp embedded in synthetic frames as two rows of black and white blocks, each starting
+# with a fixed marker so unstamped frames (cameras, files) are told apart. Survives the RGB conversion and scaling
+# down to the block size
+class FrameStamp:
+    MARKER = (1, 0, 1, 1, 0, 0, 1, 0)
+    BITS = 32
+
+    # Edge length of one block in pixels for a frame height
+    @staticmethod
+    def block_size(height):
+        return max(4, height // 135)
+
+    # Narrowest frame the stamp fits in at a frame height
+    @classmethod
+    def min_width(cls, height):
+        return cls.block_size(height) * (len(cls.MARKER) + cls.BITS + 2)
+
+    # Write the counter and a millisecond timestamp into the top-left corner of a frame
+    @classmethod
+    def stamp(cls, frame, counter, milliseconds):
+        block = cls.block_size(frame.shape[0])
+        for row, value in enumerate((counter, milliseconds), start=1):
+            bits = np.concatenate([cls.MARKER, (int(value) >> np.arange(cls.BITS)) & 1]).astype(np.uint8)
+            strip = np.repeat(bits * 255, block)
+            frame[block * row:block * (row + 1), block:block + strip.size] = strip[:, None]
+
+    # (counter, milliseconds) read back from a frame, or None when the frame carries no stamp
+    @classmethod
+    def read(cls, frame):
+        block = cls.block_size(frame.shape[0])
+        columns = block + block // 2 + block * np.arange(len(cls.MARKER) + cls.BITS)
+        if columns[-1] >= frame.shape[1]:
+            return None
+        values = []
+        for row in (1, 2):
+            samples = frame[block * row + block // 2, columns]
+            bits = (samples.mean(axis=1) > 127 if samples.ndim == 2 else samples > 127).astype(np.int64)
+            if tuple(bits[:len(cls.MARKER)]) != cls.MARKER:
+                return None
+            values.append(int(np.dot(bits[len(cls.MARKER):], 1 << np.arange(cls.BITS))))
+        return values[0], values[1]
+
+
+# Base for frame sources that stand in for a cv2.VideoCapture, so MyVideoCapture, the capture pool and the
+# multiview run on them unchanged. read() is paced to the source frame rate like a camera; when the reader falls
+# more than a frame behind, the schedule restarts and the frames it missed are counted instead of burst out
+class FrameSource:
+    def __init__(self, width, height, fps):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.frame_count = 0  # 0 for endless sources
+        self.position = -1  # frame number on the source's own clock
+        self.missed_frames = 0  # frame slots that passed while the reader was busy
+        self.next_due = None
+        self.opened = True
+
+    # True until released
+    def isOpened(self):
+        return self.opened
+
+    # Answer the capture properties MyVideoCapture asks for
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        return 0.0
+
+    # Driver settings such as the buffer size do not apply
+    def set(self, prop, value):
+        return False
+
+    # Wait for the next frame slot and return the next BGR frame, like cv2.VideoCapture.read; image is an optional
+    # array to reuse for the frame
+    def read(self, image=None):
+        if not self.opened:
+            return False, None
+        now = time.monotonic()
+        missed = 0
+        if self.next_due is None:
+            due = now
+        elif now - self.next_due >= self.interval:
+            missed = int((now - self.next_due) / self.interval)
+            due = now
+        else:
+            due = self.next_due
+        if due > now:
+            time.sleep(due - now)
+        self.next_due = due + self.interval
+        self.missed_frames += missed
+        self.position += 1 + missed
+        frame = self.next_frame(image)
+        return frame is not None, frame
+
+    # Produce the frame for the current position, in image when it fits; implemented by each source
+    def next_frame(self, image=None):
+        raise NotImplementedError
+
+    # Stop producing frames
+    def release(self):
+        self.opened = False
+
+
+# Test pattern at any resolution and frame rate: colour bars over a ramp, a moving bar so scopes and peaking see
+# motion, and a FrameStamp so FrameIntegrityChecker can count dropped, duplicated and late frames end to end
+class SyntheticSource(FrameSource):
+    BARS = ((191, 191, 191), (0, 191, 191), (191, 191, 0), (0, 191, 0), (191, 0, 191), (0, 0, 191), (191, 0, 0))
+
+    def __init__(self, width=1920, height=1080, fps=30.0):
+        if width < FrameStamp.min_width(height):
+            raise ValueError("Synthetic frames are too narrow for the frame stamp", (width, height))
+        super().__init__(width, height, fps)
+        self.base = np.empty((height, width, 3), dtype=np.uint8)
+        bars_height = height * 2 // 3
+        edges = np.linspace(0, width, len(self.BARS) + 1).astype(int)
+        for color, left, right in zip(self.BARS, edges[:-1], edges[1:]):
+            self.base[:bars_height, left:right] = color
+        self.base[bars_height:] = np.linspace(0, 255, width, dtype=np.float32).astype(np.uint8)[None, :, None]
+        self.bar_width = max(2, width // 64)
+        self.font_scale = height / 720.0
+
+    # Copy the pattern, move the bar and stamp the frame number and the current time
+    def next_frame(self, image=None):
+        frame = image if image is not None and image.shape == self.base.shape else np.empty_like(self.base)
+        np.copyto(frame, self.base)
+        number = self.position
+        left = (number * self.bar_width // 2) % (self.width - self.bar_width)
+        frame[:, left:left + self.bar_width] = 255
+        milliseconds = int(time.monotonic() * 1000) & 0xFFFFFFFF
+        FrameStamp.stamp(frame, number, milliseconds)
+        block = FrameStamp.block_size(self.height)
+        cv2.putText(frame, f"{number:010d}", (block, block * 5 + int(30 * self.font_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    self.font_scale, (255, 255, 255), max(1, int(2 * self.font_scale)), cv2.LINE_AA)
+        return frame
+
+
+# Loops a video file or an image sequence (a directory or a glob pattern) at its own or a given frame rate.
+# Decoded images are kept in a FrameCache so long sequences need not be decoded again on every loop
+class FileSource(FrameSource):
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".exr")
+
+    def __init__(self, path, fps=None, cache_bytes=1024 * 1024 * 1024):
+        self.path = path
+        self.images = None
+        self.capture = None
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(self.IMAGE_EXTENSIONS))
+        elif glob.has_magic(path):
+            self.images = sorted(glob.glob(path))
+        if self.images is not None:
+            if not self.images:
+                raise ValueError("No images found for file source", path)
+            self.cache = FrameCache(cache_bytes)
+            first = self._load(0)
+            height, width = first.shape[:2]
+            native_fps = None
+        else:
+            self.capture = cv2.VideoCapture(path)
+            if not self.capture.isOpened():
+                raise ValueError("Unable to open file source", path)
+            width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            native_fps = self.capture.get(cv2.CAP_PROP_FPS)
+        super().__init__(width, height, fps or native_fps or 30.0)
+        self.loops = 0  # times the source wrapped around to the start
+        self.next_image = 0
+
+    # Decode one image of the sequence, through the cache
+    def _load(self, index):
+        frame = self.cache.get(index)
+        if frame is None:
+            frame = cv2.imread(self.images[index], cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError("Unable to read image", self.images[index])
+            self.cache.put(index, frame)
+        return frame
+
+    # Next frame of the file or sequence, wrapping around at the end. Sequence images come straight from the cache
+    def next_frame(self, image=None):
+        if self.images is not None:
+            frame = self._load(self.next_image)
+            self.next_image += 1
+            if self.next_image == len(self.images):
+                self.next_image = 0
+                self.loops += 1
+            return frame
+        ok, frame = self.capture.read(image)
+        if not ok:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self.loops += 1
+            ok, frame = self.capture.read(image)
+        return frame if ok else None
 
-        # Resize the frame while maintaining aspect ratio
-        aspect_ratio = frame.shape[1] / frame.shape[0]  # width / height
-        target_width = self.video_label.width()
-        target_height = int(target_width / aspect_ratio)
-        resized_frame = cv2.resize(frame, (target_width, target_height))
+    # Close the file
+    def release(self):
+        super().release()
+        if self.capture is not None:
+            self.capture.release()
 
-        h, w, ch = resized_frame.shape
-        bytes_per_line = ch * w
-        q_img = QImage(resized_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_img)
-        self.video_label.setPixmap(pixmap)
+
+# Open a video source: a camera index, "synthetic[:WxH][@FPS]" for the test pattern, "file:PATH[@FPS]" for a
+# looping video file or image sequence, or anything else cv2.VideoCapture accepts (files, URLs)
+def open_source(source):
+    if isinstance(source, str):
+        kind, _, argument = source.partition(":")
+        fps = None
+        head, separator, tail = argument.rpartition("@")
+        if separator and tail.replace(".", "", 1).isdigit():
+            argument, fps = head, float(tail)
+        if kind == "synthetic":
+            width, height = parse_size(argument) if argument else (1920, 1080)
+            return SyntheticSource(width, height, fps or 30.0)
+        if kind == "file":
+            return FileSource(argument, fps=fps)
+        if source.isdigit():
+            source = int(source)
+    return cv2.VideoCapture(source)
+
+
+# Reads the FrameStamp of frames at one point of the pipeline and counts frames that were dropped (the counter
+# skipped), duplicated (the counter repeated), reordered or late (older than late_after when checked)
+class FrameIntegrityChecker:
+    def __init__(self, late_after=0.1):
+        self.late_after = late_after  # seconds from stamping after which a frame counts as late
+        self.reset()
+
+    # Forget the counter history, e.g. after switching sources
+    def reset(self):
+        self.last_counter = None
+        self.frames = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.reordered = 0
+        self.late = 0
+        self.unmarked = 0  # frames without a stamp (not from a synthetic source)
+        self.latency_total = 0.0
+        self.max_latency = 0.0
+
+    # Check one frame; usable as a capture listener
+    def check(self, captured):
+        stamp = FrameStamp.read(captured.image)
+        if stamp is None:
+            self.unmarked += 1
+            return
+        counter, milliseconds = stamp
+        latency = ((int(time.monotonic() * 1000) - milliseconds) & 0xFFFFFFFF) / 1000.0
+        last = self.last_counter
+        if last is not None:
+            if counter == last:
+                self.duplicated += 1
+            elif counter > last + 1:
+                self.dropped += counter - last - 1
+            elif counter < last:
+                self.reordered += 1
+        self.last_counter = counter
+        self.frames += 1
+        self.latency_total += latency
+        self.max_latency = max(self.max_latency, latency)
+        if latency > self.late_after:
+            self.late += 1
+
+    # Counters for the metrics export
+    def snapshot(self):
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "duplicated": self.duplicated,
+            "reordered": self.reordered,
+            "late": self.late,
+            "unmarked": self.unmarked,
+            "mean_latency_ms": 1000.0 * self.latency_total / self.frames if self.frames else 0.0,
+            "max_latency_ms": 1000.0 * self.max_latency,
+        }
 
 
 # Class for video capture and management
 class MyVideoCapture:
-    def __init__(self, video_source=0):
-        self.vid = cv2.VideoCapture(video_source)
-        self.vid.set(cv2.CAP_PROP_BUFFERSIZE, 10)
+    def __init__(self, video_source=0, threaded=False, buffer_size=2, drop_policy="latest", capture=None):
+        self.video_source = video_source
+        self.running = False
+        self.thread = None  # set before opening so release() works on a source that fails to open
+        self.release_lock = threading.Lock()
+        self.reader_exited = False
+        self.release_pending = False  # release() gave up waiting; the reader thread releases the device on exit
+        # Reuse a capture that is already open (e.g. from device discovery) instead of opening the device again
+        self.vid = capture if capture is not None else open_source(video_source)
+        # A reader thread drains the device itself, so keep the driver queue short to avoid latency
+        self.vid.set(cv2.CAP_PROP_BUFFERSIZE, 1 if threaded else 10)
 
         if not self.vid.isOpened():
             raise ValueError("Unable to open video source", video_source)
@@ -578,29 +2325,2088 @@ class MyVideoCapture:
         self.width = int(self.vid.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.height = int(self.vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    # Change the video source
-    def change_source(self, video_source):
-        self.vid.release()
-        self.vid = cv2.VideoCapture(video_source)
-        if not self.vid.isOpened():
-            raise ValueError("Unable to open video source", video_source)
+        self.sequence = 0
+        self.read_failures = 0
+        self.raw = None  # BGR frame the device decodes into; only read by the reader itself, so always reused
+        self.last_timestamp = None
+        self.frame_interval = None
+        self.listeners = []
+        self.metrics = None
+        self.ring = FrameRingBuffer(buffer_size, drop_policy)
+        if threaded:
+            self.start()
+
+    # Start the background reader thread
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._reader_loop, name=f"capture-{self.video_source}", daemon=True)
+        self.thread.start()
+
+    # Stop the background reader thread; returns False when it is still inside a read after the timeout
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            if self.thread.is_alive():
+                return False
+            self.thread = None
+        return True
+
+    # True when frames are read by the background thread
+    @property
+    def threaded(self):
+        return self.thread is not None
+
+    # Frame rate measured from the capture timestamps, falling back to the rate the driver reports
+    @property
+    def measured_fps(self):
+        if self.frame_interval:
+            return 1.0 / self.frame_interval
+        reported = self.vid.get(cv2.CAP_PROP_FPS)
+        return reported if reported > 0 else None
+
+    # Register a callback that receives every captured frame on the capture thread
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # Unregister a frame callback
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    # Frames overwritten in the ring buffer before the GUI picked them up
+    @property
+    def dropped_frames(self):
+        return self.ring.dropped_frames
+
+    # Read one frame from the device and tag it
+    def _read(self):
+        started = time.perf_counter()
+        ret, frame = self.vid.read(self.raw)
+        if not ret:
+            return None
+        self.raw = frame
+        timestamp = time.monotonic()
+        if self.last_timestamp is not None:
+            interval = timestamp - self.last_timestamp
+            self.frame_interval = interval if self.frame_interval is None else \
+                0.9 * self.frame_interval + 0.1 * interval
+        self.last_timestamp = timestamp
+        self.sequence += 1
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=FRAME_BUFFERS.acquire(frame.shape))
+        captured = CapturedFrame(image, self.sequence, timestamp)
+        if self.metrics is not None:
+            self.metrics.record("capture", time.perf_counter() - started)
+        for listener in tuple(self.listeners):
+            listener(captured)
+        return captured
+
+    # Keep reading frames into the ring buffer until stopped
+    def _reader_loop(self):
+        while self.running:
+            captured = self._read()
+            if captured is None:
+                self.read_failures += 1
+                time.sleep(0.005)
+                continue
+            self.ring.put(captured)
+        with self.release_lock:
+            self.reader_exited = True
+            if self.release_pending:
+                self.vid.release()
+
+    # Return the next frame to process, or None when no new frame has arrived (never blocks when threaded)
+    def read_latest(self):
+        if self.threaded:
+            return self.ring.get()
+        if self.vid.isOpened():
+            return self._read()
+        return None
 
     # Get the current frame from the video capture
     def get_frame(self):
-        if self.vid.isOpened():
-            ret, frame = self.vid.read()
-            if ret:
-                return ret, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.threaded:
+            captured = self.ring.peek()
+        elif self.vid.isOpened():
+            captured = self._read()
+        else:
+            captured = None
+        if captured is not None:
+            return True, captured.image
         return False, None
 
-    # Release the video capture when the object is deleted
-    def __del__(self):
+    # Stop the reader thread and release the device. A device is never released under a reader still blocked in
+    # a read; the reader releases it itself once the read returns
+    def release(self):
+        if not self.stop():
+            with self.release_lock:
+                if not self.reader_exited:
+                    self.release_pending = True
+                    return
         if self.vid.isOpened():
             self.vid.release()
 
+    # Release the video capture when the object is deleted
+    def __del__(self):
+        if hasattr(self, "vid"):
+            self.release()
+
+
+# Low-overhead per-stage timers and counters for the frame pipeline
+class PipelineMetrics:
+    def __init__(self, window=240, busy_window=2.0):
+        self.window = window  # samples kept per stage
+        self.busy_window = busy_window  # seconds the GUI busy percentage is averaged over
+        self.stage_times = {}
+        self.counters = {}
+        self.gauges = {}
+        self.present_times = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.busy_intervals = deque(maxlen=4096)
+        # Stages are also recorded from the capture and recording threads
+        self.lock = threading.Lock()
+
+    # Record the duration of one run of a stage, in seconds
+    def record(self, name, seconds):
+        with self.lock:
+            samples = self.stage_times.get(name)
+            if samples is None:
+                samples = self.stage_times[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    # Time the enclosed block as one run of a stage
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    # Increment a counter
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Set a gauge to its current value
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    # Note that a frame captured at capture_timestamp reached the screen
+    def frame_presented(self, capture_timestamp):
+        now = time.monotonic()
+        with self.lock:
+            self.present_times.append(now)
+            self.latencies.append(now - capture_timestamp)
+            self.counters["frames_presented"] = self.counters.get("frames_presented", 0) + 1
+
+    # Account time the GUI thread spent on the frame pipeline
+    def add_busy(self, seconds):
+        with self.lock:
+            self.busy_intervals.append((time.monotonic(), seconds))
+
+    # Point-in-time summary of all metrics
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            stages = {name: list(samples) for name, samples in self.stage_times.items()}
+            present_times = list(self.present_times)
+            latencies = list(self.latencies)
+            busy = sum(seconds for ended, seconds in self.busy_intervals if now - ended <= self.busy_window)
+            counters = dict(self.counters)
+
+        fps = 0.0
+        if len(present_times) > 1 and present_times[-1] > present_times[0]:
+            fps = (len(present_times) - 1) / (present_times[-1] - present_times[0])
+        return {
+            "timestamp": time.time(),
+            "fps": fps,
+            "latency": self._summary(latencies),
+            "gui_busy_percent": min(100.0, busy / self.busy_window * 100.0),
+            "stages": {name: self._summary(samples) for name, samples in stages.items()},
+            "counters": counters,
+            "gauges": dict(self.gauges),
+        }
+
+    # Mean, p95 and max of a list of durations, in milliseconds
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {"mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        values = np.asarray(samples) * 1000.0
+        return {"mean_ms": float(values.mean()), "p95_ms": float(np.percentile(values, 95)),
+                "max_ms": float(values.max())}
+
+    # Metrics in the Prometheus text exposition format
+    def prometheus_text(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        lines = [
+            "# TYPE hypervision_display_fps gauge",
+            f"hypervision_display_fps {snapshot['fps']:.3f}",
+            "# TYPE hypervision_gui_busy_percent gauge",
+            f"hypervision_gui_busy_percent {snapshot['gui_busy_percent']:.3f}",
+            "# TYPE hypervision_capture_to_display_latency_ms gauge",
+        ]
+        for statistic in ("mean", "p95", "max"):
+            lines.append(f'hypervision_capture_to_display_latency_ms{{statistic="{statistic}"}} '
+                         f"{snapshot['latency'][statistic + '_ms']:.3f}")
+        lines.append("# TYPE hypervision_stage_latency_ms gauge")
+        for name, stage in snapshot["stages"].items():
+            for statistic in ("mean", "p95", "max"):
+                lines.append(f'hypervision_stage_latency_ms{{stage="{name}",statistic="{statistic}"}} '
+                             f"{stage[statistic + '_ms']:.3f}")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE hypervision_{name}_total counter")
+            lines.append(f"hypervision_{name}_total {value}")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE hypervision_{name} gauge")
+            lines.append(f"hypervision_{name} {float(value):.3f}")
+        return "\n".join(lines) + "\n"
+
+
+# Periodically writes PipelineMetrics to a local file, as Prometheus text (.prom) or JSON
+class MetricsExporter:
+    def __init__(self, metrics, path):
+        self.metrics = metrics
+        self.path = path
+        self.format = "prometheus" if path.endswith((".prom", ".txt")) else "json"
+
+    # Write the current metrics, replacing the file atomically so scrapers never see a partial write
+    def export(self):
+        snapshot = self.metrics.snapshot()
+        if self.format == "prometheus":
+            content = self.metrics.prometheus_text(snapshot)
+        else:
+            content = json.dumps(snapshot, indent=2)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as handle:
+            handle.write(content)
+        os.replace(temporary_path, self.path)
+
+
+# Publishes the composited display picture (peaking, overlays and tally included) as MJPEG over HTTP.
+# Each frame is encoded once per quality that has viewers and shared by all of them; a viewer that cannot keep
+# up skips to the newest frame instead of queueing, so slow tablets never hold up the encoder or each other
+class MonitorStream:
+    BOUNDARY = "hypervisionframe"
+
+    def __init__(self, port=8080, host="", size=None, fps=15.0, qualities=(80,)):
+        if not qualities:
+            raise ValueError("At least one stream quality is needed", qualities)
+        self.size = size  # box the picture is fitted into; None keeps the display size
+        self.fps = fps
+        self.qualities = tuple(int(quality) for quality in qualities)  # the first one is the default
+        self.viewers = dict.fromkeys(self.qualities, 0)
+        self.latest = dict.fromkeys(self.qualities, (0, None))  # quality -> (sequence, JPEG bytes)
+        self.pending = None  # newest picture waiting for the encoder
+        self.sequence = 0
+        self.last_published = 0.0
+        self.encoded_frames = 0
+        self.dropped_frames = 0  # frames viewers skipped because they fell behind
+        self.encode_seconds = 0.0
+        self.running = True
+        self.condition = threading.Condition()
+        self.encoder = threading.Thread(target=self._encode_loop, name="stream-encoder", daemon=True)
+        self.encoder.start()
+        self.server = ThreadingHTTPServer((host, port), MonitorStreamHandler)
+        self.server.daemon_threads = True
+        self.server.stream = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stream-server", daemon=True)
+        self.thread.start()
+
+    # Connected viewers across all qualities
+    @property
+    def viewer_count(self):
+        with self.condition:
+            return sum(self.viewers.values())
+
+    # Hand the composited display buffer to the encoder; rate-limited, and free while nobody is watching
+    def publish(self, buffer):
+        now = time.monotonic()
+        if now - self.last_published < 1.0 / self.fps or not self.viewer_count:
+            return
+        self.last_published = now
+        height, width = buffer.shape[:2]
+        if self.size is not None:
+            scale = min(self.size[0] / width, self.size[1] / height, 1.0)
+            width, height = max(1, int(width * scale)), max(1, int(height * scale))
+        # The display buffer is reused for the next frame, so the encoder always gets its own picture
+        if (height, width) == buffer.shape[:2]:
+            picture = buffer.copy()
+        else:
+            picture = cv2.resize(buffer, (width, height), interpolation=cv2.INTER_AREA)
+        with self.condition:
+            self.pending = picture
+            self.condition.notify_all()
+
+    # Quality a viewer asked for, falling back to the default when it is not offered
+    def pick_quality(self, requested):
+        try:
+            quality = int(requested)
+        except (TypeError, ValueError):
+            return self.qualities[0]
+        return quality if quality in self.viewers else self.qualities[0]
+
+    # Count a viewer in; encoding at its quality starts with the next frame
+    def add_viewer(self, quality):
+        with self.condition:
+            self.viewers[quality] += 1
+
+    # Count a viewer out
+    def remove_viewer(self, quality):
+        with self.condition:
+            self.viewers[quality] -= 1
+
+    # Block until a frame newer than the given sequence is encoded at a quality; None on timeout or once closed
+    def next_frame(self, quality, after, timeout=5.0):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running or self.latest[quality][0] > after, timeout)
+            if not self.running or self.latest[quality][0] <= after:
+                return None
+            sequence, payload = self.latest[quality]
+            if after:
+                self.dropped_frames += sequence - after - 1
+            return sequence, payload
+
+    # Stop serving and disconnect every viewer
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self.encoder.join(timeout=1.0)
+
+    # Encode each published picture once per quality that has viewers
+    def _encode_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: not self.running or self.pending is not None)
+                if not self.running:
+                    return
+                picture, self.pending = self.pending, None
+                qualities = [quality for quality, viewers in self.viewers.items() if viewers]
+                self.sequence += 1
+                sequence = self.sequence
+            started = time.perf_counter()
+            picture = cv2.cvtColor(picture, cv2.COLOR_RGB2BGR)
+            encoded = {}
+            for quality in qualities:
+                ok, payload = cv2.imencode(".jpg", picture, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if ok:
+                    encoded[quality] = (sequence, payload.tobytes())
+            with self.condition:
+                self.latest.update(encoded)
+                self.encoded_frames += 1
+                self.encode_seconds += time.perf_counter() - started
+                self.condition.notify_all()
+
+
+# Serves the monitor page and the MJPEG feed of a MonitorStream
+class MonitorStreamHandler(BaseHTTPRequestHandler):
+    timeout = 10  # a viewer whose socket stops draining for this long is disconnected
+    SEND_BUFFER = 128 * 1024  # small kernel send buffer, so a slow viewer drops frames instead of lagging
+
+    # Shrink the send buffer before the connection's files are set up
+    def setup(self):
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SEND_BUFFER)
+        super().setup()
+
+    # Route a request: / is a page showing the feed, /stream.mjpg the feed itself (?quality=N picks a quality)
+    def do_GET(self):
+        url = urlparse(self.path)
+        stream = self.server.stream
+        quality = stream.pick_quality(parse_qs(url.query).get("quality", [None])[0])
+        if url.path == "/":
+            page = (f"<html><body style='margin:0;background:#111'><img src='/stream.mjpg?quality={quality}' "
+                    f"style='width:100%;height:100%;object-fit:contain'></body></html>").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+        elif url.path == "/stream.mjpg":
+            self.send_feed(stream, quality)
+        else:
+            self.send_error(404)
+
+    # Write frames as a multipart stream until the viewer disconnects or the stream closes
+    def send_feed(self, stream, quality):
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={MonitorStream.BOUNDARY}")
+        self.end_headers()
+        stream.add_viewer(quality)
+        sent = 0
+        try:
+            while stream.running:
+                frame = stream.next_frame(quality, sent)
+                if frame is None:
+                    continue
+                sent, payload = frame
+                self.wfile.write(f"--{MonitorStream.BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(payload)}\r\n\r\n".encode())
+                self.wfile.write(payload)
+                self.wfile.write(b"\r\n")
+        except (OSError, ValueError):
+            pass  # viewer went away
+        finally:
+            stream.remove_viewer(quality)
+
+    # Keep per-request logging off the console
+    def log_message(self, format, *args):
+        pass
+
+
+# Keeps the last few seconds of captured frames, JPEG-compressed within a fixed memory budget, so a
+# recording can start with the moments before Record was pressed. A 4K JPEG takes ~35 ms to encode, so frames are
+# compressed on several threads; frames still arriving faster than that are dropped and counted
+class PreRollBuffer:
+    def __init__(self, seconds=5.0, max_bytes=256 * 1024 * 1024, quality=80, compress=True, workers=None,
+                 queue_size=None):
+        self.seconds = seconds  # longest span of frames kept
+        self.max_bytes = max_bytes  # memory ceiling for the stored frames
+        self.quality = quality  # JPEG quality; lower is cheaper to store but not to encode
+        self.compress = compress  # False keeps raw frames: no CPU cost, but far fewer seconds fit the budget
+        self.entries = deque()  # (payload, shape, sequence, timestamp)
+        self.total_bytes = 0
+        self.dropped_frames = 0  # frames skipped because the encoders fell behind
+        self.evicted_frames = 0  # frames pushed out early by the memory ceiling
+        self.lock = threading.Lock()
+        self.metrics = None
+        # Raw frames need no encoding, so one thread is enough for them
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1)) if compress else 1
+        self.queue = queue.Queue(maxsize=queue_size or 2 * self.workers)
+        self.threads = [threading.Thread(target=self._worker, name=f"preroll-{number}", daemon=True)
+                        for number in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    # Span of time currently held, in seconds
+    @property
+    def duration(self):
+        with self.lock:
+            if len(self.entries) < 2:
+                return 0.0
+            return self.entries[-1][3] - self.entries[0][3]
+
+    # Frames currently held
+    @property
+    def frame_count(self):
+        return len(self.entries)
+
+    # Frame listener; compression happens on the pre-roll threads so the capture thread is never slowed
+    def submit(self, captured):
+        try:
+            self.queue.put_nowait(captured)
+        except queue.Full:
+            self.dropped_frames += 1
+
+    # Compress frames and append them until closed
+    def _worker(self):
+        while True:
+            captured = self.queue.get()
+            if captured is None:
+                self.queue.task_done()
+                break
+            started = time.perf_counter()
+            if self.compress:
+                ok, payload = cv2.imencode(".jpg", captured.image, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+                if not ok:
+                    self.queue.task_done()
+                    continue
+            else:
+                payload = FRAME_BUFFERS.detach(captured.image)
+            self._append((payload, captured.image.shape, captured.sequence, captured.timestamp))
+            if self.metrics is not None:
+                self.metrics.record("preroll_encode", time.perf_counter() - started)
+            self.queue.task_done()
+
+    # Store one entry and trim the buffer back to its time span and memory ceiling
+    def _append(self, entry):
+        with self.lock:
+            # Encoder threads can finish out of order; entries are kept in capture order
+            position = len(self.entries)
+            while position and self.entries[position - 1][2] > entry[2]:
+                position -= 1
+            self.entries.insert(position, entry)
+            self.total_bytes += entry[0].nbytes
+            newest = self.entries[-1][3]
+            while self.entries and newest - self.entries[0][3] > self.seconds:
+                self.total_bytes -= self.entries.popleft()[0].nbytes
+            while len(self.entries) > 1 and self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.entries.popleft()[0].nbytes
+                self.evicted_frames += 1
+
+    # Hand the buffered frames over in capture order and empty the buffer; decoding happens lazily in the consumer
+    def drain(self):
+        self.queue.join()
+        with self.lock:
+            entries = list(self.entries)
+        self.clear()
+        return self._decode(entries)
+
+    # Turn stored entries back into captured frames
+    @staticmethod
+    def _decode(entries):
+        for payload, shape, sequence, timestamp in entries:
+            # JPEG keeps the channel order it was given, so frames come back as RGB
+            image = cv2.imdecode(payload, cv2.IMREAD_COLOR) if payload.ndim == 1 else payload
+            if image is not None and image.shape == shape:
+                yield CapturedFrame(image, sequence, timestamp)
+
+    # Discard everything buffered so far
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    # Stop the compression threads and free the buffer
+    def close(self):
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.clear()
+
+
+# Encodes recorded frames on a background worker fed by a bounded queue. Optionally rolls over to a new segment file
+# every N seconds or bytes, and writes a JSON Lines index mapping every frame to its segment, offset and timestamp
+class RecordingWriter:
+    STANDARD_RATES = (23.976, 24.0, 25.0, 29.97, 30.0, 50.0, 59.94, 60.0)
+    DEFAULT_FPS = 29.97
+    MAX_FPS = 120.0
+    # Container extension for each codec; MJPG is intra-only, so it costs the least CPU to encode
+    CODECS = {"mp4v": ".mov", "MJPG": ".avi", "XVID": ".avi", "avc1": ".mp4"}
+    INDEX_FLUSH_FRAMES = 30
+
+    def __init__(self, path, frame_size, fps, fourcc="mp4v", queue_size=64, preroll=None, segment_seconds=None,
+                 segment_bytes=None, flush_bytes=1024 * 1024 * 1024):
+        if fourcc not in self.CODECS:
+            raise ValueError("Unknown recording codec", fourcc)
+        # The extension follows the codec; segments add a counter to the base name
+        self.root = os.path.splitext(path)[0]
+        self.extension = self.CODECS[fourcc]
+        self.fourcc = fourcc
+        self.frame_size = (int(frame_size[0]), int(frame_size[1]))
+        self.fps = fps
+        self.segment_frames = int(round(segment_seconds * fps)) if segment_seconds else None
+        self.segment_bytes = segment_bytes
+        self.segmented = bool(segment_seconds or segment_bytes)
+        self.segments = []  # paths of the segment files, in order
+        self.segment_start = 0  # frame number the current segment starts at
+        self.closed_bytes = 0  # size of the finished segments
+        os.makedirs(os.path.dirname(self.root) or ".", exist_ok=True)
+        self.writer = None
+        self._open_segment()
+
+        self.index_path = f"{self.root}.index.jsonl"
+        self.index = open(self.index_path, "w")
+        self.index.write(json.dumps({"type": "header", "fps": fps, "frame_size": list(self.frame_size),
+                                     "fourcc": fourcc, "start_time": time.time()}) + "\n")
+        self._index_segment()
+
+        # Bounded in submit(): queue_size frames, or up to flush_bytes of frames while the pre-roll is written first
+        self.queue = queue.Queue()
+        self.queue_size = queue_size
+        self.flush_bytes = flush_bytes
+        FRAME_BUFFERS.track(self)
+        self.preroll = preroll  # PreRollBuffer drained ahead of the first live frame
+        self.catching_up = preroll is not None  # until the frames queued behind the pre-roll are written
+        self.start_timestamp = None
+        self.frames_written = 0
+        self.dropped_frames = 0  # frames lost because the queue was full
+        self.duplicated_frames = 0  # frames repeated to fill timestamp gaps
+        self.skipped_frames = 0  # frames arriving faster than the container rate
+        self.bytes_written = 0
+        self.metrics = None
+        self.thread = threading.Thread(target=self._worker, name="recording-writer", daemon=True)
+        self.thread.start()
+
+    # Path of the file currently being written
+    @property
+    def path(self):
+        return self.segments[-1]
+
+    # Pick the container frame rate from the measured capture rate, snapping to a standard rate when close
+    @classmethod
+    def container_fps(cls, measured_fps):
+        if not measured_fps or measured_fps <= 0:
+            return cls.DEFAULT_FPS
+        closest = min(cls.STANDARD_RATES, key=lambda rate: abs(rate - measured_fps))
+        if abs(closest - measured_fps) / closest < 0.02:
+            return closest
+        # Containers such as MPEG-4 cap the timebase, so keep odd rates coarse and bounded
+        return min(max(round(measured_fps, 2), 1.0), cls.MAX_FPS)
+
+    # True when this OpenCV build can write the codec; pip wheels, for one, cannot open an avc1 writer
+    @classmethod
+    def codec_available(cls, fourcc):
+        if fourcc not in cls.CODECS:
+            return False
+        with tempfile.TemporaryDirectory() as directory:
+            writer = cv2.VideoWriter(os.path.join(directory, f"probe{cls.CODECS[fourcc]}"),
+                                     cv2.VideoWriter_fourcc(*fourcc), cls.DEFAULT_FPS, (64, 64))
+            available = writer.isOpened()
+            writer.release()
+        return available
+
+    # Frames waiting to be encoded
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    # Queue a captured frame for encoding; never blocks the caller. Seconds of pre-roll take a while to write, so
+    # until they and the frames queued behind them are, live frames wait in a longer queue instead of being dropped
+    def submit(self, captured):
+        limit = self.queue_size
+        if self.catching_up:
+            limit = max(limit, self.flush_bytes // captured.image.nbytes)
+        if self.queue.qsize() >= limit:
+            self.dropped_frames += 1
+            return
+        self.queue.put_nowait(captured)
+
+    # Flush the queue, finalise the file and stop the worker
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    # Start a new segment file
+    def _open_segment(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.closed_bytes += self._file_size(self.path)
+        number = len(self.segments)
+        path = f"{self.root}_{number:03d}{self.extension}" if self.segmented else f"{self.root}{self.extension}"
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.frame_size)
+        if not self.writer.isOpened():
+            raise ValueError("Unable to open video writer", path)
+        self.segments.append(path)
+
+    # Record the current segment in the index
+    def _index_segment(self):
+        self.index.write(json.dumps({"type": "segment", "segment": len(self.segments) - 1,
+                                     "file": os.path.basename(self.path), "first_frame": self.segment_start}) + "\n")
+        self.index.flush()
+
+    # Roll over when the current segment reached its length or size limit
+    def _roll_over_if_due(self):
+        if not self.segmented:
+            return
+        length = self.frames_written - self.segment_start
+        if length == 0:
+            return
+        full = self.segment_frames is not None and length >= self.segment_frames
+        if not full and self.segment_bytes is not None and length % self.INDEX_FLUSH_FRAMES == 0:
+            full = self._file_size(self.path) >= self.segment_bytes
+        if full:
+            self.segment_start = self.frames_written
+            self._open_segment()
+            self._index_segment()
+
+    # Images of the queued frames, for the buffer pool's self-check
+    def held_buffers(self):
+        with self.queue.mutex:
+            frames = list(self.queue.queue)
+        return [captured.image for captured in frames if captured is not None]
+
+    # Encode frames until close() is called
+    def _worker(self):
+        while True:
+            captured = self.queue.get()
+            # Draining only once a live frame has arrived guarantees the two overlap instead of leaving a gap;
+            # the overlapping frames are dropped by the timestamp timeline
+            if self.preroll is not None:
+                self._flush_preroll()
+            elif self.catching_up and self.queue.qsize() < self.queue_size:
+                self.catching_up = False
+            if captured is None:
+                break
+            started = time.perf_counter()
+            self._write(captured)
+            if self.metrics is not None:
+                self.metrics.record("record_write", time.perf_counter() - started)
+        self.writer.release()
+        self.index.close()
+        self._update_bytes_written()
+
+    # Write the pre-roll; its JPEG frames are decoded on a separate thread so decoding overlaps encoding
+    def _flush_preroll(self):
+        decoded = queue.Queue(maxsize=8)
+        threading.Thread(target=self._decode_preroll, args=(decoded,), name="preroll-decoder", daemon=True).start()
+        while True:
+            earlier = decoded.get()
+            if earlier is None:
+                break
+            self._write(earlier)
+        self.preroll = None
+
+    # Decode the pre-roll into a queue, ending with None
+    def _decode_preroll(self, decoded):
+        for earlier in self.preroll.drain():
+            decoded.put(earlier)
+        decoded.put(None)
+
+    # Write a frame into the slot its timestamp maps to on the constant-rate timeline
+    def _write(self, captured):
+        if self.start_timestamp is None:
+            self.start_timestamp = captured.timestamp
+        offset = captured.timestamp - self.start_timestamp
+        target = int(round(offset * self.fps))
+        if target < self.frames_written:
+            self.skipped_frames += 1
+            return
+
+        frame = cv2.cvtColor(captured.image, cv2.COLOR_RGB2BGR, dst=FRAME_BUFFERS.acquire(captured.image.shape))
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            frame = cv2.resize(frame, self.frame_size, dst=FRAME_BUFFERS.acquire(
+                (self.frame_size[1], self.frame_size[0], 3)))
+        repeats = target - self.frames_written + 1
+        for _ in range(repeats):
+            self._roll_over_if_due()
+            self.writer.write(frame)
+            self.index.write(f'{{"frame": {self.frames_written}, "segment": {len(self.segments) - 1}, '
+                             f'"offset": {self.frames_written - self.segment_start}, "timestamp": {offset:.6f}}}\n')
+            self.frames_written += 1
+        self.duplicated_frames += repeats - 1
+        if self.frames_written % self.INDEX_FLUSH_FRAMES < repeats:
+            self.index.flush()
+            self._update_bytes_written()
+
+    # Size of a file, or 0 when it cannot be read
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    # Refresh the total size of the output files
+    def _update_bytes_written(self):
+        self.bytes_written = self.closed_bytes + self._file_size(self.path)
+
+
+# Reads a recording's index sidecar to find the segment and offset of any frame or moment without scanning the files
+class RecordingIndex:
+    def __init__(self, index_path):
+        self.index_path = index_path
+        directory = os.path.dirname(index_path)
+        self.header = {}
+        self.segments = []  # (path, first frame)
+        frames = []
+        with open(index_path) as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # a line cut short by a crash ends the usable index
+                kind = entry.get("type")
+                if kind == "header":
+                    self.header = entry
+                elif kind == "segment":
+                    self.segments.append((os.path.join(directory, entry["file"]), entry["first_frame"]))
+                else:
+                    frames.append((entry["frame"], entry["segment"], entry["offset"], entry["timestamp"]))
+        table = np.asarray(frames, dtype=np.float64).reshape(-1, 4)
+        self.frame_segments = table[:, 1].astype(np.int32)
+        self.frame_offsets = table[:, 2].astype(np.int64)
+        self.timestamps = table[:, 3]
+
+    # Number of frames in the index
+    def __len__(self):
+        return len(self.timestamps)
+
+    # Segment file and frame offset within it for a recording frame number
+    def locate(self, frame):
+        if not 0 <= frame < len(self):
+            raise ValueError("Frame outside the recording", frame)
+        return self.segments[self.frame_segments[frame]][0], int(self.frame_offsets[frame])
+
+    # Frame captured at (or just before) a time in seconds since the recording started
+    def frame_at(self, seconds):
+        return max(0, int(np.searchsorted(self.timestamps, seconds, side="right")) - 1)
+
+
+# Memory-capped LRU cache of decoded frames, keyed by frame number
+class FrameCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        FRAME_BUFFERS.track(self)
+
+    # Cached images, for the buffer pool's self-check
+    def held_buffers(self):
+        with self.lock:
+            return list(self.frames.values())
+
+    # Cached frame, marked as most recently used, or None
+    def get(self, number):
+        with self.lock:
+            image = self.frames.get(number)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.frames.move_to_end(number)
+            return image
+
+    # True when a frame is cached, without touching its recency
+    def __contains__(self, number):
+        with self.lock:
+            return number in self.frames
+
+    # Add a frame, evicting the least recently used ones beyond the memory cap
+    def put(self, number, image):
+        # Cached frames can stay for minutes, so they are taken out of the buffer pool
+        FRAME_BUFFERS.detach(image)
+        with self.lock:
+            previous = self.frames.pop(number, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self.frames[number] = image
+            self.total_bytes += image.nbytes
+            while len(self.frames) > 1 and self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.frames.popitem(last=False)[1].nbytes
+
+    # Drop every cached frame
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.total_bytes = 0
+
+
+# Plays back a recorded clip (a segment index or a single video file) through the capture interface, so the
+# display, scopes and peaking work on it unchanged. A background thread decodes ahead of the playhead in the
+# direction of travel into an LRU frame cache, so jogging and shuttling never wait on the decoder
+class ClipPlayer:
+    SHUTTLE_SPEEDS = (-8.0, -4.0, -2.0, -1.0, 0.0, 1.0, 2.0, 4.0, 8.0)
+    REFRESH_INTERVAL = 0.1  # a paused frame is handed out again this often so setting changes show on it
+
+    def __init__(self, path, cache_bytes=512 * 1024 * 1024, lookahead=30):
+        self.video_source = path
+        self.index = None
+        if path.endswith(".index.jsonl"):
+            self.index = RecordingIndex(path)
+            self.segments = [segment for segment, first_frame in self.index.segments]
+            self.frame_count = len(self.index)
+            fps = self.index.header.get("fps")
+        else:
+            self.segments = [path]
+            probe = cv2.VideoCapture(path)
+            if not probe.isOpened():
+                raise ValueError("Unable to open clip", path)
+            self.frame_count = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = probe.get(cv2.CAP_PROP_FPS)
+            probe.release()
+        if self.frame_count <= 0:
+            raise ValueError("Clip has no frames", path)
+        self.fps = fps if fps and fps > 0 else RecordingWriter.DEFAULT_FPS
+        self.decoders = {}  # segment number -> [MyVideoCapture, next offset it will decode]
+        first = self._decoder(0)[0]
+        self.width = first.width
+        self.height = first.height
+
+        self.lookahead = lookahead
+        self.cache = FrameCache(cache_bytes)
+        self.position = 0.0  # playhead in frames
+        self.speed = 0.0  # shuttle speed, in multiples of real time; negative plays backwards
+        self.direction = 1
+        self.last_tick = None
+        self.shown = None  # frame number last handed out
+        self.shown_at = 0.0
+        self.sequence = 0
+        self.frame_interval = 1.0 / self.fps
+        self.measured_fps = self.fps
+        self.dropped_frames = 0
+        self.failed_frames = 0  # frames that could not be decoded and show the frame before them instead
+        self.threaded = False  # the display polls the playhead rather than waiting for frame arrivals
+        self.listeners = []  # kept for the capture interface; playback never feeds recordings or the pre-roll
+        self.metrics = None
+        self.wake = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._decode_loop, name="clip-decoder", daemon=True)
+        self.thread.start()
+
+    # Register a frame callback; playback frames are never delivered to listeners
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # Unregister a frame callback
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    # Frame number under the playhead
+    @property
+    def current_frame(self):
+        return int(self.position)
+
+    # Move the playhead to a frame
+    def seek(self, frame):
+        previous = self.position
+        self.position = float(min(max(int(frame), 0), self.frame_count - 1))
+        if self.position != previous:
+            self.direction = 1 if self.position > previous else -1
+        self.wake.set()
+
+    # Step a number of frames and stop shuttling
+    def jog(self, frames):
+        self.speed = 0.0
+        self.seek(self.current_frame + frames)
+
+    # Play at a multiple of real time; 0 pauses
+    def shuttle(self, speed):
+        self.speed = float(speed)
+        if speed:
+            self.direction = 1 if speed > 0 else -1
+        self.last_tick = None
+        self.wake.set()
+
+    # Step the shuttle one notch faster forwards (1) or backwards (-1), like J/L on an editing deck
+    def shuttle_step(self, step):
+        speeds = self.SHUTTLE_SPEEDS
+        current = min(range(len(speeds)), key=lambda i: abs(speeds[i] - self.speed))
+        self.shuttle(speeds[min(max(current + step, 0), len(speeds) - 1)])
+
+    # Segment number and offset within it for a clip frame
+    def locate(self, frame):
+        if self.index is None:
+            return 0, frame
+        path, offset = self.index.locate(frame)
+        return self.segments.index(path), offset
+
+    # Advance the playhead and return the frame under it when it changed (or is due a refresh); never blocks
+    def read_latest(self):
+        now = time.monotonic()
+        if self.speed and self.last_tick is not None:
+            self.position += self.speed * self.fps * (now - self.last_tick)
+            if not 0 <= self.position <= self.frame_count - 1:
+                self.position = float(min(max(self.position, 0), self.frame_count - 1))
+                self.speed = 0.0
+            self.wake.set()
+        self.last_tick = now
+        number = self.current_frame
+        if number == self.shown and now - self.shown_at < self.REFRESH_INTERVAL:
+            return None
+        image = self.cache.get(number)
+        if image is None:
+            self.wake.set()
+            return None
+        self.shown = number
+        self.shown_at = now
+        self.sequence += 1
+        return CapturedFrame(image, self.sequence, now)
+
+    # Frame under the playhead, if decoded
+    def get_frame(self):
+        image = self.cache.get(self.shown) if self.shown is not None else None
+        return image is not None, image
+
+    # Stop decoding and free the cache
+    def release(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        for decoder, offset in self.decoders.values():
+            decoder.release()
+        self.decoders.clear()
+        self.cache.clear()
+
+    # Decoder for a segment, opened on first use
+    def _decoder(self, segment):
+        decoder = self.decoders.get(segment)
+        if decoder is None:
+            decoder = self.decoders[segment] = [MyVideoCapture(self.segments[segment]), 0]
+        return decoder
+
+    # Next frame to decode: the playhead first, then the look-ahead window in the direction of travel
+    def _next_wanted(self):
+        playhead = self.current_frame
+        for distance in range(self.lookahead + 1):
+            number = playhead + distance * self.direction
+            if not 0 <= number < self.frame_count:
+                break
+            if number not in self.cache:
+                return number
+        return None
+
+    # Decode frames until released, sleeping while the window around the playhead is cached
+    def _decode_loop(self):
+        while self.running:
+            number = self._next_wanted()
+            if number is None:
+                self.wake.wait(0.05)
+                self.wake.clear()
+                continue
+            try:
+                self._decode(number)
+            except (ValueError, cv2.error, OSError):
+                # A frame that cannot be decoded (a truncated last segment, a frame past the real end of the clip)
+                # is filled with the one before it, or black, so the playhead moves on; it is counted and reported
+                self.failed_frames += 1
+                previous = self.cache.get(number - 1) if number else None
+                if previous is None:
+                    previous = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+                self.cache.put(number, previous)
+
+    # Decode a frame into the cache. Seeking is the costly part for inter-frame codecs, so short gaps are read
+    # through, and going backwards seeks once to the start of the window and decodes forwards through it
+    def _decode(self, number):
+        segment, offset = self.locate(number)
+        decoder = self._decoder(segment)
+        capture, next_offset = decoder
+        if not next_offset <= offset <= next_offset + self.lookahead:
+            start = max(0, offset - self.lookahead) if self.direction < 0 else offset
+            capture.vid.set(cv2.CAP_PROP_POS_FRAMES, start)
+            next_offset = start
+        while next_offset <= offset:
+            captured = capture.read_latest()
+            if captured is None:
+                decoder[1] = next_offset
+                raise ValueError("Unable to decode frame", number)
+            self.cache.put(number - (offset - next_offset), captured.image)
+            next_offset += 1
+        decoder[1] = next_offset
+
+
+# Encodes stills on a thread pool so saving never stalls the monitor; bursts are held in memory and encoded afterwards
+class SnapshotWriter:
+    FORMATS = {"jpeg": ".jpg", "png": ".png", "raw": ".npy"}
+    MAX_BURST = 240  # frames a burst may hold in memory
+    MAX_BURST_BYTES = 1024 * 1024 * 1024  # and their total size: about 40 raw 4K frames, all 240 at 1080p
+
+    def __init__(self, directory="/ScreenShots", fmt="jpeg", quality=95, size=None, workers=2):
+        if fmt not in self.FORMATS:
+            raise ValueError("Unknown snapshot format", fmt)
+        self.directory = directory
+        self.format = fmt
+        self.quality = quality  # JPEG quality 0-100, or PNG compression 0-9 mapped from it
+        self.size = size  # optional (width, height) to upscale to; None keeps the captured resolution
+        # Numbering carries on from earlier sessions so new stills never overwrite old ones
+        self.photo_counter = self._next_number("Photo", ".")
+        self.burst_counter = self._next_number("Burst", "_")
+        self.burst = None  # [capture, frames, count, prefix] while a burst is being grabbed
+        self.pending = 0
+        self.saved = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.metrics = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot")
+
+    # Stills queued or being encoded
+    @property
+    def queue_depth(self):
+        return self.pending
+
+    # Number after the highest one already in the directory, for names like Photo12.jpg or Burst3_001.png
+    def _next_number(self, prefix, separator):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 1
+        highest = 0
+        for name in names:
+            if name.startswith(prefix):
+                digits = name[len(prefix):].split(separator, 1)[0]
+                if digits.isdigit():
+                    highest = max(highest, int(digits))
+        return highest + 1
+
+    # True while a burst is still grabbing frames
+    @property
+    def bursting(self):
+        return self.burst is not None
+
+    # Save one captured frame in the background; returns the path it will be written to
+    def save(self, captured):
+        path = os.path.join(self.directory, f"Photo{self.photo_counter}{self.FORMATS[self.format]}")
+        self.photo_counter += 1
+        self._submit(captured.image, path)
+        return path
+
+    # Grab the next count frames from a capture into memory, then encode them all; long bursts of large frames
+    # are shortened to MAX_BURST_BYTES
+    def start_burst(self, capture, count):
+        if self.burst is not None:
+            return False
+        count = max(1, min(int(count), self.MAX_BURST))
+        self.burst = [capture, [], count, f"Burst{self.burst_counter}"]
+        self.burst_counter += 1
+        # A switched source carries its listeners over, so never register the collector twice
+        capture.remove_listener(self._collect)
+        capture.add_listener(self._collect)
+        return True
+
+    # Frame listener for bursts; runs on the capture thread and only keeps a reference
+    def _collect(self, captured):
+        burst = self.burst
+        if burst is None or len(burst[1]) >= burst[2]:
+            return
+        if not burst[1]:
+            # The frame size is only known once the first frame arrives; shorten the burst to fit the memory cap
+            burst[2] = max(1, min(burst[2], self.MAX_BURST_BYTES // captured.image.nbytes))
+        FRAME_BUFFERS.detach(captured.image)
+        burst[1].append(captured)
+        if len(burst[1]) == burst[2]:
+            self._finish_burst()
+
+    # Stop grabbing and queue every frame collected so far
+    def _finish_burst(self):
+        with self.lock:
+            burst, self.burst = self.burst, None
+        if burst is None:
+            return
+        capture, frames, count, prefix = burst
+        capture.remove_listener(self._collect)
+        extension = self.FORMATS[self.format]
+        for index, captured in enumerate(frames):
+            self._submit(captured.image, os.path.join(self.directory, f"{prefix}_{index + 1:03d}{extension}"))
+
+    # Hand a frame to the encoder pool
+    def _submit(self, image, path):
+        with self.lock:
+            self.pending += 1
+        self.executor.submit(self._encode, image, path)
+
+    # Convert, optionally upscale and write one still
+    def _encode(self, image, path):
+        started = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if self.size is not None and (image.shape[1], image.shape[0]) != self.size:
+                image = cv2.resize(image, self.size, interpolation=cv2.INTER_CUBIC)
+            if self.format == "raw":
+                np.save(path, image)
+                written = True
+            else:
+                if self.format == "jpeg":
+                    params = [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+                else:
+                    params = [cv2.IMWRITE_PNG_COMPRESSION, min(9, max(0, (100 - int(self.quality)) // 10))]
+                written = cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+        except (OSError, cv2.error):
+            written = False
+        with self.lock:
+            self.pending -= 1
+            if written:
+                self.saved += 1
+            else:
+                self.failed += 1
+        if self.metrics is not None:
+            self.metrics.record("snapshot_encode", time.perf_counter() - started)
+
+    # Finish any running burst and wait for every queued still to be written
+    def close(self):
+        self._finish_burst()
+        self.executor.shutdown(wait=True)
+
+
+# Computes focus peaking edge masks with 8/16-bit kernels, optionally on a reduced resolution tier
+class FocusPeakingEngine:
+    DETECTORS = ("laplacian", "sobel", "dog")
+    TIERS = ("full", "display", "half", "quarter")
+
+    def __init__(self, detector="laplacian", tier="display"):
+        if detector not in self.DETECTORS:
+            raise ValueError("Unknown peaking detector", detector)
+        if tier not in self.TIERS:
+            raise ValueError("Unknown peaking tier", tier)
+        self.detector = detector
+        self.tier = tier
+        self._lut_threshold = None
+        self._lut = None
+        self._color_key = None
+        self._color_plane = None
+
+    # Lookup table mapping edge strength above the threshold to 1 and everything else to 0
+    def threshold_lut(self, threshold):
+        if threshold != self._lut_threshold:
+            lut = np.zeros(256, dtype=np.uint8)
+            lut[min(int(threshold) + 1, 256):] = 1
+            self._lut = lut
+            self._lut_threshold = threshold
+        return self._lut
+
+    # Luma plane of an RGB frame, in a pooled buffer
+    @staticmethod
+    def luma(frame):
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=FRAME_BUFFERS.acquire(frame.shape[:2]))
+
+    # Reduce the luma plane to the resolution the detector runs at
+    def analysis_plane(self, gray, display_size=None):
+        height, width = gray.shape
+        if self.tier == "display" and display_size is not None:
+            target_width, target_height = display_size
+            # Keep the frame's aspect ratio; never upscale
+            scale = min(target_width / width, target_height / height)
+            if scale < 1:
+                size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                return cv2.resize(gray, size, dst=FRAME_BUFFERS.acquire((size[1], size[0])),
+                                  interpolation=cv2.INTER_LINEAR)
+        elif self.tier in ("half", "quarter"):
+            for _ in range(1 if self.tier == "half" else 2):
+                height, width = (height + 1) // 2, (width + 1) // 2
+                gray = cv2.pyrDown(gray, dst=FRAME_BUFFERS.acquire((height, width)))
+        return gray
+
+    # Edge strength of an 8-bit luma plane as an 8-bit image
+    def edge_strength(self, gray):
+        pool = FRAME_BUFFERS
+        edges = pool.acquire(gray.shape)
+        if self.detector == "sobel":
+            gradient = pool.acquire(gray.shape, np.int16)
+            gradient_x = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0, dst=gradient),
+                                             dst=pool.acquire(gray.shape))
+            gradient_y = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1, dst=gradient),
+                                             dst=pool.acquire(gray.shape))
+            return cv2.addWeighted(gradient_x, 0.5, gradient_y, 0.5, 0, dst=edges)
+        if self.detector == "dog":
+            fine = cv2.GaussianBlur(gray, (0, 0), 1.0, dst=pool.acquire(gray.shape))
+            coarse = cv2.GaussianBlur(gray, (0, 0), 2.0, dst=pool.acquire(gray.shape))
+            return cv2.convertScaleAbs(cv2.absdiff(fine, coarse, dst=fine), dst=edges, alpha=4)
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S, dst=pool.acquire(gray.shape, np.int16))
+        return cv2.convertScaleAbs(laplacian, dst=edges)
+
+    # Binary edge mask (0/1) of a luma plane at that plane's resolution
+    def edge_mask(self, plane, threshold):
+        edges = self.edge_strength(plane)
+        return cv2.LUT(edges, self.threshold_lut(threshold), dst=edges)
+
+    # Binary edge mask (0/1) of an RGB frame, scaled back to the frame's size
+    def mask(self, frame, threshold, display_size=None):
+        gray = self.luma(frame)
+        mask = self.edge_mask(self.analysis_plane(gray, display_size), threshold)
+        if mask.shape != gray.shape:
+            mask = cv2.resize(mask, (gray.shape[1], gray.shape[0]), dst=FRAME_BUFFERS.acquire(gray.shape),
+                              interpolation=cv2.INTER_NEAREST)
+        return mask
+
+    # Mean edge strength and fraction of pixels above the threshold, as a numeric focus measure
+    def edge_statistics(self, frame, threshold, display_size=None):
+        edges = self.edge_strength(self.analysis_plane(self.luma(frame), display_size))
+        above = cv2.LUT(edges, self.threshold_lut(threshold), dst=FRAME_BUFFERS.acquire(edges.shape))
+        return float(cv2.mean(edges)[0]), float(cv2.mean(above)[0])
+
+    # Solid image of the peaking colour, cached per frame shape and colour
+    def color_plane(self, shape, color):
+        key = (shape, tuple(color))
+        if key != self._color_key:
+            self._color_plane = np.empty(shape, dtype=np.uint8)
+            self._color_plane[:] = color
+            self._color_key = key
+        return self._color_plane
+
+    # Paint the peaking colour over the frame in place wherever edges exceed the threshold
+    def apply(self, frame, threshold, color, display_size=None):
+        mask = self.mask(frame, threshold, display_size)
+        cv2.copyTo(self.color_plane(frame.shape, color), mask, frame)
+        return frame
+
+
+# Draws every enabled overlay in one pass over the display-resolution buffer, with geometry and lookup tables
+# cached per buffer size and setting
+class OverlayCompositor:
+    # Exposure bands (percent of full scale) and the colours false colour shows them in; other levels stay grey
+    FALSE_COLOR_BANDS = (
+        (0.0, 2.5, (128, 0, 160)),  # crushed
+        (2.5, 10.0, (0, 70, 255)),
+        (38.0, 44.0, (0, 200, 70)),  # middle grey
+        (52.0, 58.0, (255, 130, 170)),  # skin
+        (90.0, 97.0, (255, 200, 0)),
+        (97.0, 100.01, (255, 0, 0)),  # clipped
+    )
+    TALLY_COLOR = (255, 0, 0)
+    ZEBRA_COLOR = (0, 0, 0)
+    FOCUS_MAP_OPACITY = 0.35
+    GRID_COLOR = (200, 200, 200)
+
+    def __init__(self, peaking_engine, zebra_level=95.0):
+        self.peaking_engine = peaking_engine
+        self.zebras = False
+        self.false_color = False
+        self.thirds = False
+        self.zebra_level = zebra_level  # percent of full scale at and above which zebras are drawn
+        self._shape = None
+        self._stripes = None
+        self._grid_lines = None
+        self._zebra_key = None
+        self._zebra_lut = None
+        self._false_color_lut = None
+        self._planes = {}
+
+    # Rebuild the geometry cached for a buffer size
+    def _prepare(self, shape):
+        if shape == self._shape:
+            return
+        height, width = shape[:2]
+        rows, columns = np.indices((height, width))
+        # Diagonal stripes, 4 px wide
+        self._stripes = (((rows + columns) // 4) % 2).astype(np.uint8)
+        self._grid_lines = [((width * i // 3, 0), (width * i // 3, height - 1)) for i in (1, 2)] + \
+                           [((0, height * i // 3), (width - 1, height * i // 3)) for i in (1, 2)]
+        self._planes = {}
+        self._shape = shape
+
+    # Solid image of one colour at the buffer size
+    def _plane(self, color):
+        plane = self._planes.get(color)
+        if plane is None:
+            plane = np.empty(self._shape, dtype=np.uint8)
+            plane[:] = color
+            self._planes[color] = plane
+        return plane
+
+    # Lookup table marking luma levels at or above the zebra level
+    def zebra_lut(self):
+        if self._zebra_key != self.zebra_level:
+            lut = np.zeros(256, dtype=np.uint8)
+            lut[min(255, int(round(self.zebra_level * 255 / 100))):] = 1
+            self._zebra_lut = lut
+            self._zebra_key = self.zebra_level
+        return self._zebra_lut
+
+    # Per-channel lookup tables turning a luma level into its false colour
+    def false_color_luts(self):
+        if self._false_color_lut is None:
+            levels = np.arange(256, dtype=np.float32)
+            lut = np.repeat((levels * 0.6).astype(np.uint8)[:, None], 3, axis=1)
+            percent = levels * 100 / 255
+            for low, high, color in self.FALSE_COLOR_BANDS:
+                lut[(percent >= low) & (percent < high)] = color
+            # One single-channel table per channel: three LUTs and a merge beat expanding luma to RGB first
+            self._false_color_lut = [np.ascontiguousarray(lut[:, channel]) for channel in range(3)]
+        return self._false_color_lut
+
+    # Apply the overlays to a display buffer that already holds the scaled picture; frame is the full-resolution
+    # source, only read when peaking runs on a tier other than the display
+    # peaking_mask is a 0/1 edge mask computed elsewhere (e.g. by an analysis worker process) to use instead;
+    # focus_map is a scored FocusMap to draw as a heat map with its peak readout
+    def compose(self, frame, buffer, peaking=False, threshold=20, peaking_color=(255, 0, 0), tally=False,
+                peaking_mask=None, focus_map=None):
+        self._prepare(buffer.shape)
+        gray = None
+        local_peaking = peaking and peaking_mask is None
+        if self.zebras or self.false_color or (local_peaking and self.peaking_engine.tier == "display"):
+            gray = FocusPeakingEngine.luma(buffer)
+
+        if self.false_color:
+            cv2.merge([cv2.LUT(gray, lut, dst=FRAME_BUFFERS.acquire(gray.shape)) for lut in self.false_color_luts()],
+                      dst=buffer)
+
+        if self.zebras:
+            mask = cv2.LUT(gray, self.zebra_lut(), dst=FRAME_BUFFERS.acquire(gray.shape))
+            cv2.bitwise_and(mask, self._stripes, dst=mask)
+            cv2.copyTo(self._plane(self.ZEBRA_COLOR), mask, buffer)
+
+        if peaking:
+            engine = self.peaking_engine
+            if peaking_mask is not None:
+                mask = peaking_mask
+            elif engine.tier == "display":
+                mask = engine.edge_mask(gray, threshold)
+            else:
+                mask = engine.edge_mask(engine.analysis_plane(engine.luma(frame)), threshold)
+            if mask.shape != buffer.shape[:2]:
+                mask = cv2.resize(mask, (buffer.shape[1], buffer.shape[0]), dst=FRAME_BUFFERS.acquire(buffer.shape[:2]),
+                                  interpolation=cv2.INTER_NEAREST)
+            cv2.copyTo(self._plane(tuple(peaking_color)), mask, buffer)
+
+        if focus_map is not None and focus_map.scores is not None:
+            self._draw_focus_map(frame, buffer, focus_map)
+
+        if self.thirds:
+            for start, end in self._grid_lines:
+                cv2.line(buffer, start, end, self.GRID_COLOR, 1)
+
+        if tally:
+            height, width = buffer.shape[:2]
+            cv2.rectangle(buffer, (0, 0), (width - 1, height - 1), self.TALLY_COLOR, thickness=10)
+        return buffer
+
+    # Blend the tile scores over the region they cover as a heat map, outline the sharpest tile and print the
+    # peak score and the highest peak held since the region was chosen
+    def _draw_focus_map(self, frame, buffer, focus_map):
+        scale_x = buffer.shape[1] / frame.shape[1]
+        scale_y = buffer.shape[0] / frame.shape[0]
+        left, top, width, height = focus_map.region(frame.shape)
+        x0, y0 = int(left * scale_x), int(top * scale_y)
+        x1, y1 = max(x0 + 1, int((left + width) * scale_x)), max(y0 + 1, int((top + height) * scale_y))
+        scores = focus_map.scores
+        top_score = scores.max()
+        levels = (scores * (255.0 / top_score)).astype(np.uint8) if top_score > 0 else np.zeros(scores.shape, np.uint8)
+        colors = cv2.cvtColor(cv2.applyColorMap(levels, cv2.COLORMAP_JET), cv2.COLOR_BGR2RGB)
+        area = buffer[y0:y1, x0:x1]
+        heat = cv2.resize(colors, (x1 - x0, y1 - y0), dst=FRAME_BUFFERS.acquire(area.shape),
+                          interpolation=cv2.INTER_NEAREST)
+        cv2.addWeighted(area, 1.0 - self.FOCUS_MAP_OPACITY, heat, self.FOCUS_MAP_OPACITY, 0, dst=area)
+        if focus_map.roi is not None:
+            cv2.rectangle(buffer, (x0, y0), (x1 - 1, y1 - 1), self.GRID_COLOR, 1)
+        if focus_map.peak_tile is not None:
+            row, column = focus_map.peak_tile
+            rows, columns = scores.shape
+            cv2.rectangle(buffer, (x0 + (x1 - x0) * column // columns, y0 + (y1 - y0) * row // rows),
+                          (x0 + (x1 - x0) * (column + 1) // columns - 1, y0 + (y1 - y0) * (row + 1) // rows - 1),
+                          (255, 255, 255), 2)
+        cv2.putText(buffer, f"Peak {focus_map.peak:.0f}  hold {focus_map.peak_hold:.0f}", (x0 + 6, y0 + 22),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+
+
+# Splits the picture, or a region of it, into a grid of tiles and scores each tile's sharpness, giving focus a
+# number to track instead of edge outlines alone. Tiles are scored on worker threads, where OpenCV releases the GIL,
+# and only tiles whose content changed since they were last scored are scored again
+class FocusMap:
+    METRICS = ("laplacian", "tenengrad")
+    SIGNATURE_SIZE = 4  # thumbnail pixels per tile edge used to spot tiles that changed
+    CHANGE_LEVEL = 3  # thumbnail difference, in 8-bit levels, that marks a tile as changed
+
+    def __init__(self, columns=8, rows=6, metric="laplacian", roi=None, workers=None, interval=1):
+        if columns < 1 or rows < 1:
+            raise ValueError("Focus map needs at least one tile", (columns, rows))
+        if metric not in self.METRICS:
+            raise ValueError("Unknown focus metric", metric)
+        self.columns = columns
+        self.rows = rows
+        self.metric = metric  # variance of the Laplacian, or Tenengrad (mean squared Sobel gradient)
+        self.roi = None
+        self.set_roi(roi)
+        self.interval = interval  # score every n-th frame
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="focus-map")
+        self.frame_count = 0
+        self.scores = None  # (rows, columns) sharpness of each tile
+        self.signature = None  # thumbnail of the region when its tiles were last scored
+        self.peak = 0.0  # sharpest tile's score
+        self.peak_tile = None  # (row, column) of the sharpest tile
+        self.peak_hold = 0.0  # highest peak since the region or settings last changed
+        self.rescored_tiles = 0  # tiles scored again on the last update
+
+    # Restrict the map to a region given as (x, y, width, height) fractions of the picture; None covers it all
+    def set_roi(self, roi):
+        if roi is not None:
+            x, y, width, height = roi
+            if not (0 <= x < 1 and 0 <= y < 1 and 0 < width <= 1 - x + 1e-6 and 0 < height <= 1 - y + 1e-6):
+                raise ValueError("Focus region must lie inside the picture", roi)
+        self.roi = roi
+        self.invalidate()
+
+    # Score every tile again on the next update and restart the peak hold
+    def invalidate(self):
+        self.signature = None
+        self.scores = None
+        self.peak_hold = 0.0
+
+    # Region the tiles cover, in pixels of a frame of the given shape
+    def region(self, shape):
+        height, width = shape[:2]
+        if self.roi is None:
+            return 0, 0, width, height
+        x, y, roi_width, roi_height = self.roi
+        left, top = int(x * width), int(y * height)
+        return (left, top, max(self.columns, min(width - left, int(roi_width * width))),
+                max(self.rows, min(height - top, int(roi_height * height))))
+
+    # Sharpness of one luma tile; cv2.meanStdDev gives the variance and, with the mean, the mean square
+    def score(self, tile):
+        if self.metric == "tenengrad":
+            total = 0.0
+            for dx, dy in ((1, 0), (0, 1)):
+                gradient = cv2.Sobel(tile, cv2.CV_32F, dx, dy, dst=FRAME_BUFFERS.acquire(tile.shape, np.float32))
+                mean, deviation = cv2.meanStdDev(gradient)
+                total += float(deviation[0, 0]) ** 2 + float(mean[0, 0]) ** 2
+            return total
+        laplacian = cv2.Laplacian(tile, cv2.CV_16S, dst=FRAME_BUFFERS.acquire(tile.shape, np.int16))
+        return float(cv2.meanStdDev(laplacian)[1][0, 0]) ** 2
+
+    # Score the tiles of an RGB frame whose content changed; returns True when the scores were updated
+    def update(self, frame):
+        self.frame_count += 1
+        if (self.frame_count - 1) % self.interval and self.scores is not None:
+            return False
+        left, top, width, height = self.region(frame.shape)
+        gray = FocusPeakingEngine.luma(frame[top:top + height, left:left + width])
+        size = self.SIGNATURE_SIZE
+        signature = cv2.resize(gray, (self.columns * size, self.rows * size),
+                               dst=FRAME_BUFFERS.acquire((self.rows * size, self.columns * size)),
+                               interpolation=cv2.INTER_AREA)
+        if self.signature is None or self.signature.shape != signature.shape or self.scores is None:
+            changed = np.ones((self.rows, self.columns), dtype=bool)
+            self.scores = np.zeros((self.rows, self.columns), dtype=np.float64)
+        else:
+            difference = cv2.absdiff(signature, self.signature)
+            changed = difference.reshape(self.rows, size, self.columns, size).max(axis=(1, 3)) > self.CHANGE_LEVEL
+        self.signature = signature.copy()
+        rows = np.linspace(0, height, self.rows + 1).astype(int)
+        columns = np.linspace(0, width, self.columns + 1).astype(int)
+        tiles = [(row, column) for row, column in zip(*np.nonzero(changed))]
+        scores = self.executor.map(lambda tile: self.score(gray[rows[tile[0]]:rows[tile[0] + 1],
+                                                                columns[tile[1]]:columns[tile[1] + 1]]), tiles)
+        for (row, column), score in zip(tiles, scores):
+            self.scores[row, column] = score
+        self.rescored_tiles = len(tiles)
+        peak_index = int(np.argmax(self.scores))
+        self.peak_tile = divmod(peak_index, self.columns)
+        self.peak = float(self.scores.flat[peak_index])
+        self.peak_hold = max(self.peak_hold, self.peak)
+        return True
+
+    # Stop the worker threads
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+# Result of a single FrameAnalyzer pass
+class FrameAnalysis:
+    __slots__ = ("luma_histogram", "rgb_histograms", "waveform", "vectorscope")
+
+    def __init__(self, luma_histogram=None, rgb_histograms=None, waveform=None, vectorscope=None):
+        self.luma_histogram = luma_histogram
+        self.rgb_histograms = rgb_histograms
+        self.waveform = waveform  # (256 levels, columns) counts; three column blocks for the RGB parade
+        self.vectorscope = vectorscope  # (Cr, Cb) counts
+
+
+# Computes the histograms and scopes from one shared decimated copy of the frame
+class FrameAnalyzer:
+    VECTORSCOPE_BINS = 128
+    SCOPE_PIXELS = 1920 * 1080 // 16  # scopes decimate further above this so 4K costs the same as 1080p
+
+    def __init__(self, stride=4, interval=1, normalize=True, scope_rate=None, waveform_columns=256):
+        self.stride = max(1, int(stride))  # analyse every n-th pixel in both directions
+        self.interval = max(1, int(interval))  # analyse every n-th frame
+        self.normalize = normalize  # scale each RGB histogram to a peak of 1 for display
+        self.scope_rate = scope_rate  # waveform/vectorscope updates per second, independent of the frame rate
+        self.waveform_columns = waveform_columns
+        self.frame_count = 0
+        self.last_scope_time = None
+        self.column_index = None  # cached column-to-waveform-bucket map for the current width
+
+    # Take the decimated copy every analysis stage works from
+    def decimate(self, frame):
+        if self.stride == 1:
+            return frame
+        sampled = frame[::self.stride, ::self.stride]
+        decimated = FRAME_BUFFERS.acquire(sampled.shape)
+        np.copyto(decimated, sampled)
+        return decimated
+
+    # True when the scopes are due, given their own update rate
+    def scopes_due(self):
+        if self.scope_rate is None:
+            return True
+        now = time.monotonic()
+        if self.last_scope_time is not None and now - self.last_scope_time < 1.0 / self.scope_rate:
+            return False
+        self.last_scope_time = now
+        return True
+
+    # Level-by-column counts of one or more planes, binned in one np.bincount call
+    def waveform(self, planes):
+        height, width = planes[0].shape
+        columns = min(self.waveform_columns, width)
+        if self.column_index is None or self.column_index.shape != (width,) or self.column_index.max() >= columns:
+            self.column_index = (np.arange(width, dtype=np.int32) * columns // width).astype(np.int32)
+        blocks = len(planes)
+        stride = blocks * columns
+        # intp indices are counted by np.bincount as they are, without a converted copy
+        indices = FRAME_BUFFERS.acquire((blocks, height, width), np.intp)
+        for block, plane in enumerate(planes):
+            np.multiply(plane, stride, out=indices[block], dtype=np.intp)
+            indices[block] += self.column_index + block * columns
+        return np.bincount(indices.ravel(), minlength=256 * stride).reshape(256, stride)
+
+    # Cr-by-Cb counts of the decimated frame
+    def vectorscope(self, decimated):
+        ycrcb = cv2.cvtColor(decimated, cv2.COLOR_RGB2YCrCb, dst=FRAME_BUFFERS.acquire(decimated.shape))
+        shift = 8 - int(np.log2(self.VECTORSCOPE_BINS))
+        bins = self.VECTORSCOPE_BINS
+        cb = FRAME_BUFFERS.acquire(ycrcb.shape[:2])
+        np.right_shift(ycrcb[..., 2], shift, out=cb)
+        index = FRAME_BUFFERS.acquire(ycrcb.shape[:2], np.intp)
+        np.right_shift(ycrcb[..., 1], shift, out=index, dtype=np.intp)
+        index *= bins
+        index += cb
+        return np.bincount(index.ravel(), minlength=bins * bins).reshape(bins, bins)
+
+    # Analyse an RGB frame; returns None when the frame is skipped or nothing was requested.
+    # waveform is None, "luma" or "parade"
+    def analyze(self, frame, luma=True, rgb=True, waveform=None, vectorscope=False):
+        self.frame_count += 1
+        histograms = (luma or rgb) and not (self.frame_count - 1) % self.interval
+        scopes = (waveform or vectorscope) and self.scopes_due()
+        if not (histograms or scopes):
+            return None
+        luma, rgb = luma and histograms, rgb and histograms
+        waveform, vectorscope = waveform if scopes else None, vectorscope and scopes
+
+        decimated = self.decimate(frame)
+        analysis = FrameAnalysis()
+        gray = None
+        if luma or waveform == "luma":
+            gray = FocusPeakingEngine.luma(decimated)
+        if luma:
+            analysis.luma_histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).reshape(-1)
+        if rgb:
+            histograms = []
+            for channel in range(3):
+                histogram = cv2.calcHist([decimated], [channel], None, [256], [0, 256]).reshape(-1)
+                # Normalize histograms to values between 0 and 1
+                peak = histogram.max()
+                if self.normalize and peak > 0:
+                    histogram /= peak
+                histograms.append(histogram)
+            analysis.rgb_histograms = histograms
+        if waveform or vectorscope:
+            step = max(1, int(np.ceil(np.sqrt(decimated.shape[0] * decimated.shape[1] / self.SCOPE_PIXELS))))
+            sampled = decimated
+            if step > 1:
+                sampled = FRAME_BUFFERS.acquire(decimated[::step, ::step].shape)
+                np.copyto(sampled, decimated[::step, ::step])
+            if waveform == "luma":
+                analysis.waveform = self.waveform([gray[::step, ::step]])
+            elif waveform == "parade":
+                planes = [FRAME_BUFFERS.acquire(sampled.shape[:2]) for _ in range(3)]
+                analysis.waveform = self.waveform(cv2.split(sampled, planes))
+            if vectorscope:
+                analysis.vectorscope = self.vectorscope(sampled)
+        return analysis
+
+
+# Runs the monitor's analysis headlessly over a video file, splitting it into frame ranges across processes
+class BatchAnalyzer:
+    CHUNKS_PER_WORKER = 4
+
+    def __init__(self, path, workers=None, stride=4, threshold=20, detector="laplacian", peaking_tier="half",
+                 proxy_path=None, proxy_width=640, peaking_color=(255, 0, 0)):
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.stride = stride
+        self.threshold = threshold
+        self.detector = detector
+        self.peaking_tier = peaking_tier
+        self.proxy_path = proxy_path
+        self.proxy_width = proxy_width
+        self.peaking_color = peaking_color
+
+    # Split the file into contiguous frame ranges
+    def frame_ranges(self):
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            raise ValueError("Unable to open video file", self.path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or RecordingWriter.DEFAULT_FPS
+        cap.release()
+        if frame_count <= 0:
+            # Unknown length: a single worker reads to the end of the file
+            return [(0, None)]
+        chunk_count = min(frame_count, self.workers * self.CHUNKS_PER_WORKER)
+        bounds = np.linspace(0, frame_count, chunk_count + 1).astype(int)
+        return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    # Analyse the whole file and write the per-frame statistics to a compressed columnar .npz file
+    def run(self, output_path):
+        ranges = self.frame_ranges()
+        jobs = []
+        for index, (start, stop) in enumerate(ranges):
+            part_path = f"{self.proxy_path}.part{index:04d}.avi" if self.proxy_path else None
+            jobs.append((self.path, start, stop, self.stride, self.threshold, self.detector, self.peaking_tier,
+                         part_path, self.proxy_width, self.fps, self.peaking_color))
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+            results = [result for result in pool.map(BatchAnalyzer.analyze_range, jobs) if len(result["frame"])]
+        if not results:
+            raise ValueError("No frames could be read from video file", self.path)
+
+        columns = {name: np.concatenate([result[name] for result in results]) for name in results[0]}
+        np.savez_compressed(output_path, source=np.array(self.path), fps=np.array(self.fps), **columns)
+        if self.proxy_path:
+            self.join_proxy([job[7] for job in jobs])
+        return columns
+
+    # Concatenate the per-range proxy parts into one file and remove them
+    def join_proxy(self, part_paths):
+        writer = None
+        for part_path in part_paths:
+            cap = cv2.VideoCapture(part_path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if writer is None:
+                    writer = cv2.VideoWriter(self.proxy_path, cv2.VideoWriter_fourcc(*"MJPG"), self.fps,
+                                             (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+            cap.release()
+            os.remove(part_path)
+        if writer is not None:
+            writer.release()
+
+    # Analyse one frame range in a worker process
+    @staticmethod
+    def analyze_range(job):
+        (path, start, stop, stride, threshold, detector, peaking_tier,
+         part_path, proxy_width, fps, peaking_color) = job
+        # Parallelism comes from the process pool, so keep OpenCV single-threaded per worker
+        cv2.setNumThreads(1)
+        analyzer = FrameAnalyzer(stride=stride, normalize=False)
+        engine = FocusPeakingEngine(detector=detector, tier=peaking_tier)
+        proxy_engine = FocusPeakingEngine(detector=detector, tier="full")
+        cap = cv2.VideoCapture(path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        proxy = None
+        levels = np.arange(256, dtype=np.float64)
+
+        rows = {"frame": [], "timestamp_ms": [], "luma_mean": [], "luma_clipped_low": [],
+                "luma_clipped_high": [], "rgb_mean": [], "focus_score": [], "peaking_fraction": [],
+                "luma_histogram": [], "rgb_histogram": []}
+        index = start
+        while stop is None or index < stop:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            analysis = analyzer.analyze(frame)
+            luma = analysis.luma_histogram
+            pixels = max(float(luma.sum()), 1.0)
+            focus_score, peaking_fraction = engine.edge_statistics(frame, threshold)
+
+            rows["frame"].append(index)
+            rows["timestamp_ms"].append(timestamp_ms)
+            rows["luma_mean"].append(float(luma @ levels) / pixels)
+            rows["luma_clipped_low"].append(float(luma[:3].sum()) / pixels)
+            rows["luma_clipped_high"].append(float(luma[253:].sum()) / pixels)
+            rows["rgb_mean"].append([float(hist @ levels) / pixels for hist in analysis.rgb_histograms])
+            rows["focus_score"].append(focus_score)
+            rows["peaking_fraction"].append(peaking_fraction)
+            rows["luma_histogram"].append(luma)
+            rows["rgb_histogram"].append(analysis.rgb_histograms)
+
+            if part_path:
+                proxy_height = max(2, int(frame.shape[0] * proxy_width / frame.shape[1]) // 2 * 2)
+                small = cv2.resize(frame, (proxy_width, proxy_height), interpolation=cv2.INTER_AREA)
+                proxy_engine.apply(small, threshold, peaking_color)
+                if proxy is None:
+                    proxy = cv2.VideoWriter(part_path, cv2.VideoWriter_fourcc(*"MJPG"), fps,
+                                            (proxy_width, proxy_height))
+                proxy.write(cv2.cvtColor(small, cv2.COLOR_RGB2BGR))
+            index += 1
+
+        cap.release()
+        if proxy is not None:
+            proxy.release()
+        dtypes = {"frame": np.int64, "timestamp_ms": np.float64, "luma_histogram": np.uint32,
+                  "rgb_histogram": np.uint32}
+        return {name: np.asarray(values, dtype=dtypes.get(name, np.float32)) for name, values in rows.items()}
+
+
+# Fixed-size ring of frames in shared memory, so worker processes read frames without pickling them.
+# Each slot carries the sequence number of the frame in it, letting readers detect a slot that was reused
+class SharedFrameRing:
+    def __init__(self, shape, slots):
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=frame_bytes * slots + 8 * slots)
+        self.frames, self.sequences = self.views(self.shm, self.shape, slots)
+        self.sequences[:] = -1
+
+    # Frame and sequence arrays over a shared memory block
+    @staticmethod
+    def views(shm, shape, slots):
+        frame_bytes = int(np.prod(shape))
+        frames = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf)
+        sequences = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=frame_bytes * slots)
+        return frames, sequences
+
+    # Name workers attach to
+    @property
+    def name(self):
+        return self.shm.name
+
+    # Copy a frame into a slot
+    def write(self, slot, image, sequence):
+        self.sequences[slot] = -1
+        np.copyto(self.frames[slot], image)
+        self.sequences[slot] = sequence
+
+    # Free the shared memory
+    def close(self):
+        self.frames = self.sequences = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Offloads per-frame analysis (histograms, scopes, peaking masks, focus statistics) to worker processes that read
+# frames from a SharedFrameRing and return compact results
+class AnalysisProcessPool:
+    attached = {}  # worker side: shared memory name -> (SharedMemory, frames, sequences)
+    analyzers = {}  # worker side: cached FrameAnalyzer / FocusPeakingEngine instances
+
+    def __init__(self, workers=4):
+        self.workers = max(1, int(workers))
+        # Spawned workers never inherit the GUI process's Qt and capture threads
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.ring = None
+        self.in_flight = {}  # slot -> (future, captured frame)
+        self.skipped_frames = 0  # frames not submitted because every worker was busy
+        self.broken = False  # set once a worker process has died; the pool cannot take work after that
+
+    # Frames currently being analysed
+    @property
+    def queue_depth(self):
+        return len(self.in_flight)
+
+    # Copy a captured frame into the ring and queue it; returns False when every worker is busy
+    def submit(self, captured, options):
+        image = captured.image
+        if self.broken:
+            return False
+        if len(self.in_flight) >= self.workers:
+            self.skipped_frames += 1
+            return False
+        if self.ring is None or self.ring.shape != image.shape:
+            if self.in_flight:
+                self.skipped_frames += 1
+                return False
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = SharedFrameRing(image.shape, self.workers + 1)
+        slot = next(slot for slot in range(self.ring.slots) if slot not in self.in_flight)
+        self.ring.write(slot, image, captured.sequence)
+        task = (self.ring.name, self.ring.shape, self.ring.slots, slot, captured.sequence, options)
+        try:
+            future = self.executor.submit(AnalysisProcessPool.analyze_shared, task)
+        except BrokenProcessPool:
+            self.broken = True
+            return False
+        self.in_flight[slot] = (future, captured)
+        return True
+
+    # Results of finished frames, oldest first
+    def results(self):
+        finished = []
+        for slot, (future, captured) in list(self.in_flight.items()):
+            if future.done():
+                del self.in_flight[slot]
+                try:
+                    result = None if future.cancelled() else future.result()
+                except BrokenProcessPool:
+                    self.broken = True
+                    result = None
+                except Exception:
+                    # A frame a worker failed on is skipped; the next one is analysed as usual
+                    result = None
+                if result is not None:
+                    result["captured"] = captured
+                    finished.append(result)
+        return sorted(finished, key=lambda result: result["sequence"])
+
+    # Stop the workers and free the ring
+    def close(self):
+        for future, captured in self.in_flight.values():
+            future.cancel()
+        self.executor.shutdown(wait=True)
+        self.in_flight.clear()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    # Analyse one frame from the ring in a worker process
+    @staticmethod
+    def analyze_shared(task):
+        name, shape, slots, slot, sequence, options = task
+        if name not in AnalysisProcessPool.attached:
+            # Parallelism comes from the process pool, so keep OpenCV single-threaded per worker
+            cv2.setNumThreads(1)
+            for shm, frames, sequences in AnalysisProcessPool.attached.values():
+                shm.close()
+            AnalysisProcessPool.attached.clear()
+            shm = shared_memory.SharedMemory(name=name)
+            AnalysisProcessPool.attached[name] = (shm,) + SharedFrameRing.views(shm, shape, slots)
+        shm, frames, sequences = AnalysisProcessPool.attached[name]
+        if sequences[slot] != sequence:
+            return None
+        frame = frames[slot]
+
+        analyzer = AnalysisProcessPool.analyzers.get(("analyzer", options["stride"]))
+        if analyzer is None:
+            analyzer = FrameAnalyzer(stride=options["stride"], interval=1)
+            AnalysisProcessPool.analyzers[("analyzer", options["stride"])] = analyzer
+        analysis = analyzer.analyze(frame, luma=options["luma"], rgb=options["rgb"], waveform=options["waveform"],
+                                    vectorscope=options["vectorscope"])
+        result = {"sequence": sequence, "analysis": analysis, "peaking_mask": None, "mask_shape": None,
+                  "focus": None}
+        if analysis is not None:
+            if analysis.waveform is not None:
+                analysis.waveform = analysis.waveform.astype(np.uint32)
+            if analysis.vectorscope is not None:
+                analysis.vectorscope = analysis.vectorscope.astype(np.uint32)
+
+        peaking = options["peaking"]
+        if peaking is not None:
+            threshold, detector, tier, display_size = peaking
+            engine = AnalysisProcessPool.analyzers.get(("engine", detector, tier))
+            if engine is None:
+                engine = FocusPeakingEngine(detector=detector, tier=tier)
+                AnalysisProcessPool.analyzers[("engine", detector, tier)] = engine
+            plane = engine.analysis_plane(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), display_size)
+            edges = engine.edge_strength(plane)
+            mask = cv2.LUT(edges, engine.threshold_lut(threshold))
+            # Bit-packed, the mask is an eighth of its size to send back
+            result["peaking_mask"] = np.packbits(mask)
+            result["mask_shape"] = mask.shape
+            result["focus"] = (float(cv2.mean(edges)[0]), float(cv2.mean(mask)[0]))
+        return result
+
+    # Unpack a result's peaking mask back into a 0/1 plane
+    @staticmethod
+    def unpack_mask(result):
+        if result["peaking_mask"] is None:
+            return None
+        height, width = result["mask_shape"]
+        return np.unpackbits(result["peaking_mask"], count=height * width).reshape(height, width)
+
+
+# Parse a WIDTHxHEIGHT size argument
+def parse_size(text):
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    return width, height
+
+
+# Parse an X,Y,W,H region given as fractions of the picture
+def parse_region(text):
+    try:
+        x, y, width, height = (float(part) for part in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected X,Y,W,H fractions, got {text!r}")
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < width <= 1 - x and 0 < height <= 1 - y):
+        raise argparse.ArgumentTypeError(f"region {text!r} is not inside the picture")
+    return x, y, width, height
+
+
+# Parse the command-line options
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Hyper-Vision video monitor")
+    batch = parser.add_argument_group("headless batch analysis")
+    batch.add_argument("--analyze", metavar="VIDEO", help="analyse a video file without opening the monitor")
+    batch.add_argument("--stats", metavar="PATH", help="per-frame statistics output (.npz, default: VIDEO.stats.npz)")
+    batch.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    batch.add_argument("--stride", type=int, default=4, help="analyse every n-th pixel for the histograms")
+    batch.add_argument("--threshold", type=int, default=20, help="focus peaking threshold")
+    batch.add_argument("--detector", choices=FocusPeakingEngine.DETECTORS, default="laplacian",
+                       help="focus peaking edge detector")
+    batch.add_argument("--peaking-tier", choices=FocusPeakingEngine.TIERS, default="half",
+                       help="resolution the focus statistics are computed at")
+    batch.add_argument("--proxy", metavar="PATH", help="also render a peaking-overlay proxy video (MJPG .avi)")
+    batch.add_argument("--proxy-width", type=int, default=640, help="width of the proxy video")
+    monitor = parser.add_argument_group("monitor")
+    monitor.add_argument("--metrics-file", metavar="PATH",
+                         help="periodically export pipeline metrics (.prom for Prometheus text, otherwise JSON)")
+    monitor.add_argument("--metrics-interval", type=float, default=5.0, help="seconds between metrics exports")
+    monitor.add_argument("--snapshot-format", choices=SnapshotWriter.FORMATS, default="jpeg",
+                         help="still image format (raw writes RGB .npy arrays)")
+    monitor.add_argument("--snapshot-quality", type=int, default=95, help="JPEG quality / PNG effort, 0-100")
+    monitor.add_argument("--snapshot-size", metavar="WxH", type=parse_size, default=None,
+                         help="upscale stills to this size, e.g. 3840x2160 (default: captured resolution)")
+    monitor.add_argument("--analysis-workers", type=int, default=0,
+                         help="analyse frames and compute peaking masks in this many worker processes (0: in-process)")
+    monitor.add_argument("--no-load-shedding", dest="load_shedding", action="store_false",
+                         help="never reduce analysis, peaking resolution or display rate under load")
+    monitor.add_argument("--zebra-level", type=float, default=95.0,
+                         help="percent of full scale at and above which zebras are drawn")
+    monitor.add_argument("--burst-frames", type=int, default=10, help="frames grabbed by a burst")
+    monitor.add_argument("--preroll-seconds", type=float, default=5.0,
+                         help="seconds before Record is pressed that are included in recordings (0 disables)")
+    monitor.add_argument("--preroll-memory", type=int, default=256, metavar="MB", help="memory ceiling of the pre-roll")
+    monitor.add_argument("--preroll-quality", type=int, default=80,
+                         help="JPEG quality of pre-roll frames; lower fits more seconds into the ceiling")
+    monitor.add_argument("--preroll-uncompressed", action="store_true",
+                         help="keep pre-roll frames uncompressed: no CPU cost, but far fewer seconds fit")
+    monitor.add_argument("--preroll-workers", type=int, default=None,
+                         help="threads compressing pre-roll frames (default: up to 4)")
+    recording = parser.add_argument_group("recording")
+    recording.add_argument("--record-dir", default="/ScreenShots", help="directory recordings and stills are written to")
+    recording.add_argument("--record-codec", choices=RecordingWriter.CODECS, default="mp4v",
+                           help="recording codec; MJPG is intra-only and cheapest to encode")
+    recording.add_argument("--segment-seconds", type=float, default=None,
+                           help="start a new segment file after this many seconds")
+    recording.add_argument("--segment-mb", type=float, default=None, help="start a new segment file after this many MB")
+    recording.add_argument("--review-cache-mb", type=int, default=512,
+                           help="memory for decoded frames when reviewing a recording")
+    streaming = parser.add_argument_group("network monitoring feed")
+    streaming.add_argument("--stream-port", type=int, default=None,
+                           help="serve the monitor picture as MJPEG over HTTP on this port")
+    streaming.add_argument("--stream-size", metavar="WxH", type=parse_size, default=None,
+                           help="fit the feed inside this size (default: display size)")
+    streaming.add_argument("--stream-fps", type=float, default=15.0, help="frame rate of the feed")
+    streaming.add_argument("--stream-quality", type=int, nargs="+", default=[80],
+                           help="JPEG qualities offered; viewers pick one with ?quality=N, the first is the default")
+    monitor.add_argument("--focus-grid", metavar="COLUMNSxROWS", type=parse_size, default=(8, 6),
+                         help="tiles of the focus map")
+    monitor.add_argument("--focus-metric", choices=FocusMap.METRICS, default="laplacian",
+                         help="sharpness score of the focus map tiles")
+    monitor.add_argument("--focus-roi", metavar="X,Y,W,H", type=parse_region, default=None,
+                         help="limit the focus map to a region, as fractions of the picture (e.g. 0.25,0.25,0.5,0.5)")
+    monitor.add_argument("--focus-workers", type=int, default=None, help="threads scoring focus map tiles")
+    sources = parser.add_argument_group("sources and soak testing")
+    sources.add_argument("--source", dest="sources", action="append", metavar="SPEC",
+                         help="use this source instead of probing cameras; repeat for several. A camera index, "
+                              "synthetic[:WxH][@FPS] for a stamped test pattern, file:PATH[@FPS] to loop a video "
+                              "or image sequence, or any path or URL OpenCV can open")
+    sources.add_argument("--check-integrity", action="store_true",
+                         help="count dropped, duplicated and late frames from the stamps of synthetic sources, "
+                              "and cross-check that recycled frame buffers are no longer held anywhere")
+    sources.add_argument("--late-ms", type=float, default=100.0,
+                         help="frames older than this when checked count as late")
+    sources.add_argument("--run-seconds", type=float, default=None, help="quit after this many seconds")
+    args = parser.parse_args(argv)
+    # Reject a codec this OpenCV build cannot write now, rather than when Record is pressed
+    if not args.analyze and not RecordingWriter.codec_available(args.record_codec):
+        parser.error(f"--record-codec {args.record_codec} is not supported by this OpenCV build; "
+                     f"try MJPG or mp4v")
+    return args
+
 
 # Entry point of the application
 if __name__ == "__main__":
-    app = QApplication([])
-    window = App()
-    app.exit(app.exec_())
+    args = parse_arguments()
+    if args.analyze:
+        stats_path = args.stats or f"{os.path.splitext(args.analyze)[0]}.stats.npz"
+        batch_analyzer = BatchAnalyzer(args.analyze, workers=args.workers, stride=args.stride,
+                                       threshold=args.threshold, detector=args.detector,
+                                       peaking_tier=args.peaking_tier, proxy_path=args.proxy,
+                                       proxy_width=args.proxy_width)
+        columns = batch_analyzer.run(stats_path)
+        print(f"Analysed {len(columns['frame'])} frames of {args.analyze} -> {stats_path}")
+    else:
+        app = QApplication([])
+        window = App(metrics_path=args.metrics_file, metrics_interval=args.metrics_interval,
+                     snapshot_format=args.snapshot_format, snapshot_quality=args.snapshot_quality,
+                     snapshot_size=args.snapshot_size, burst_frames=args.burst_frames,
+                     preroll_seconds=args.preroll_seconds, preroll_memory=args.preroll_memory * 1024 * 1024,
+                     preroll_quality=args.preroll_quality, preroll_compress=not args.preroll_uncompressed,
+                     zebra_level=args.zebra_level, load_shedding=args.load_shedding,
+                     analysis_workers=args.analysis_workers, record_dir=args.record_dir,
+                     record_codec=args.record_codec, segment_seconds=args.segment_seconds,
+                     segment_bytes=int(args.segment_mb * 1024 * 1024) if args.segment_mb else None,
+                     review_cache_bytes=args.review_cache_mb * 1024 * 1024, stream_port=args.stream_port,
+                     stream_size=args.stream_size, stream_fps=args.stream_fps, stream_qualities=args.stream_quality,
+                     sources=args.sources, check_integrity=args.check_integrity, late_after=args.late_ms / 1000.0,
+                     focus_grid=args.focus_grid, focus_metric=args.focus_metric, focus_roi=args.focus_roi,
+                     focus_workers=args.focus_workers, preroll_workers=args.preroll_workers)
+        if args.run_seconds:
+            QTimer.singleShot(int(args.run_seconds * 1000), window.close)
+            QTimer.singleShot(int(args.run_seconds * 1000), app.quit)
+        app.exit(app.exec_())
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# The benchmark never needs a display or a camera
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from HyperVision import App, CapturedFrame
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+# Stand-in for MyVideoCapture that hands out prebuilt synthetic frames
+class SyntheticCapture:
+    def __init__(self, width, height, frame_count=8, fps=60.0):
+        self.video_source = f"synthetic:{width}x{height}"
+        self.width = width
+        self.height = height
+        self.measured_fps = fps
+        self.dropped_frames = 0
+        self.listeners = []
+        self.sequence = 0
+        self.frames = [self.make_frame(width, height, index) for index in range(frame_count)]
+
+    # Gradient with texture and hard edges so histograms and peaking have real work to do
+    @staticmethod
+    def make_frame(width, height, index):
+        rng = np.random.default_rng(index)
+        ramp = np.linspace(0, 255, width, dtype=np.float32)
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = np.stack([ramp, ramp[::-1], np.full(width, 128, dtype=np.float32)], axis=1).astype(np.uint8)
+        noise = rng.integers(0, 24, size=(height // 8, width // 8, 3), dtype=np.uint8)
+        cv2.add(frame, cv2.resize(noise, (width, height), interpolation=cv2.INTER_NEAREST), dst=frame)
+        for _ in range(12):
+            x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+            cv2.rectangle(frame, (x, y), (x + width // 10, y + height // 10), (255, 255, 255), 3)
+        return frame
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def read_latest(self):
+        self.sequence += 1
+        captured = CapturedFrame(self.frames[self.sequence % len(self.frames)], self.sequence, time.monotonic())
+        for listener in tuple(self.listeners):
+            listener(captured)
+        return captured
+
+    def get_frame(self):
+        return True, self.frames[self.sequence % len(self.frames)]
+
+    def release(self):
+        pass
+
+
+# Summarise a list of per-frame latencies in milliseconds
+def summarise(samples):
+    samples = np.asarray(samples, dtype=np.float64) * 1000.0
+    mean = float(samples.mean())
+    return {
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4),
+        "fps": round(1000.0 / mean, 2) if mean > 0 else None,
+    }
+
+
+# Time a callable once per frame, then measure its transient allocations in a separate traced pass
+def measure(call, frames, warmup, frame_bytes):
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    stats = summarise(samples)
+
+    # tracemalloc slows everything down, so it never overlaps the timed pass
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(frames, 20)):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    stats["alloc_bytes_per_frame"] = int(np.median(peaks))
+    stats["alloc_frames_per_frame"] = round(float(np.median(peaks)) / frame_bytes, 2)
+    return stats
+
+
+# Run every pipeline stage at one resolution
+def benchmark_resolution(qt_app, width, height, frames, warmup):
+    capture = SyntheticCapture(width, height)
+    window = App(capture=capture)
+    window.timer.stop()
+    # Stage timings must not change because the scheduler started shedding work
+    window.scheduler.adaptive = False
+    window.focus_peaking_btn.setChecked(True)
+    window.focus_map_btn.setChecked(True)
+    window.histogram_widget.show()
+    window.RGBhistogram_widget.show()
+    qt_app.processEvents()
+
+    frame = capture.frames[0]
+    frame_bytes = frame.nbytes
+    analyzer = window.analyzer
+    results = {}
+
+    # Analysis runs on every frame here so the histogram cost is not hidden by the temporal interval
+    interval = analyzer.interval
+    analyzer.interval = 1
+    results["calcHist"] = measure(lambda: analyzer.analyze(frame), frames, warmup, frame_bytes)
+    analyzer.interval = interval
+
+    # Waveform (RGB parade) and vectorscope on every frame, without the analyzer's own rate limit
+    scope_rate = analyzer.scope_rate
+    analyzer.scope_rate = None
+    results["scopes"] = measure(lambda: analyzer.analyze(frame, luma=False, rgb=False, waveform="parade",
+                                                         vectorscope=True), frames, warmup, frame_bytes)
+    analyzer.scope_rate = scope_rate
+
+    # Focus map with every tile scored again on each frame, as if the whole picture kept changing
+    focus_map = window.focus_map
+    results["focus_map"] = measure(lambda: (focus_map.invalidate(), focus_map.update(frame)), frames, warmup,
+                                   frame_bytes)
+
+    # Every overlay the compositor offers, drawn into the display buffer
+    compositor = window.compositor
+    compositor.zebras = compositor.false_color = compositor.thirds = True
+    buffer = window.video_surface.scale(frame)
+    results["scale"] = measure(lambda: window.video_surface.scale(frame), frames, warmup, frame_bytes)
+    results["compose"] = measure(lambda: compositor.compose(frame, buffer, peaking=True, threshold=window.threshold_value,
+                                                            peaking_color=window.focus_peaking_color, tally=True,
+                                                            focus_map=focus_map),
+                                 frames, warmup, frame_bytes)
+    results["display_frame"] = measure(lambda: window.display_frame(frame), frames, warmup, frame_bytes)
+    results["paint"] = measure(lambda: (window.video_surface.update(), qt_app.processEvents()), frames, warmup,
+                               frame_bytes)
+
+    # Full loop with every tool enabled, as if recording (tally border on, no writer attached)
+    window.recording = True
+    results["update_frame"] = measure(lambda: (window.update_frame(), qt_app.processEvents()), frames, warmup,
+                                      frame_bytes)
+    window.recording = False
+
+    window.close()
+    window.deleteLater()
+    qt_app.processEvents()
+    return results
+
+
+# Describe the environment so results from different machines and commits are not mixed up
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+    }
+
+
+# Print a table of the results, with the relative change against a previous run when given
+def report(results, baseline=None):
+    for resolution, stages in results.items():
+        print(f"\n{resolution}")
+        print(f"  {'stage':<22}{'mean ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'fps':>10}{'alloc MB':>10}{'vs base':>10}")
+        for stage, stats in stages.items():
+            change = ""
+            previous = (baseline or {}).get(resolution, {}).get(stage)
+            if previous and previous["mean_ms"] > 0:
+                change = f"{(stats['mean_ms'] / previous['mean_ms'] - 1) * 100:+.1f}%"
+            print(f"  {stage:<22}{stats['mean_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+                  f"{stats['fps'] or 0:>10.1f}{stats['alloc_bytes_per_frame'] / 1e6:>10.2f}{change:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Hyper-Vision frame pipeline with synthetic frames")
+    parser.add_argument("--resolutions", nargs="+", choices=RESOLUTIONS, default=list(RESOLUTIONS))
+    parser.add_argument("--frames", type=int, default=200, help="timed frames per stage")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed frames per stage")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", metavar="JSON", help="previous results to compare against")
+    args = parser.parse_args(argv)
+
+    qt_app = QApplication.instance() or QApplication([])
+    results = {}
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        results[name] = benchmark_resolution(qt_app, width, height, args.frames, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)["results"]
+    report(results, baseline)
+
+    with open(args.output, "w") as handle:
+        json.dump({"environment": environment(), "frames": args.frames, "results": results}, handle, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())